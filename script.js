@@ -16,6 +16,18 @@ let verifyProc = null
 let verifyBuffer = ''
 let verifyRequestId = 0
 const verifyPending = new Map()
+let verifyBinary = false
+let verifyReady = false
+let verifyReadyWaiters = []
+// Frames wait this long for the server's "ready" message before their own timeout starts
+const VERIFY_STARTUP_TIMEOUT = 30000
+
+// A frame still queued in the server after this long is answered with
+// { dropped: true } instead of being processed (its result would be stale)
+const VERIFY_FRAME_DEADLINE_MS = 2000
+
+// Binary frame protocol (see secure_exam_proctoring/src/frame_protocol.py)
+const VERIFY_FRAME_MAGIC = 'SEBF'
 
 function startVerifyProcess() {
   if (verifyProc) return
@@ -35,6 +47,11 @@ function startVerifyProcess() {
       if (!line) continue
       try {
         const msg = JSON.parse(line)
+        if (msg.type === 'ready') {
+          console.log('Verification server ready:', msg.timings)
+          setVerifyReady(true)
+          continue
+        }
         const pending = verifyPending.get(msg.id)
         if (pending) {
           verifyPending.delete(msg.id)
@@ -57,11 +74,68 @@ function startVerifyProcess() {
     }
     verifyPending.clear()
     verifyProc = null
+    verifyBinary = false
+    // Release waiting frames so they fail fast instead of sitting out the startup timeout
+    setVerifyReady(false)
+  })
+
+  // Ask the server which protocols it speaks; older servers just answer with an error
+  sendVerifyRequest({ cmd: 'hello' })
+    .then((msg) => {
+      verifyBinary = Array.isArray(msg.protocols) && msg.protocols.includes('binary')
+    })
+    .catch(() => {
+      verifyBinary = false
+    })
+}
+
+function setVerifyReady(ready) {
+  verifyReady = ready
+  const waiters = verifyReadyWaiters
+  verifyReadyWaiters = []
+  waiters.forEach((resolve) => resolve())
+}
+
+function waitForVerifyReady() {
+  if (verifyReady) return Promise.resolve()
+  return new Promise((resolve) => {
+    const timer = setTimeout(resolve, VERIFY_STARTUP_TIMEOUT)
+    verifyReadyWaiters.push(() => {
+      clearTimeout(timer)
+      resolve()
+    })
   })
 }
 
-function sendVerifyRequest(payload) {
+function encodeVerifyFrame(id, payload) {
+  const { image, ...fields } = payload
+  let bytes
+  let encoding = 'jpeg'
+  if (typeof image === 'string') {
+    const comma = image.indexOf(',')
+    const match = /^data:image\/(\w+)/.exec(image)
+    if (match) encoding = match[1]
+    bytes = Buffer.from(comma >= 0 ? image.slice(comma + 1) : image, 'base64')
+  } else {
+    bytes = Buffer.from(image.buffer, image.byteOffset, image.byteLength)
+  }
+
+  const header = Buffer.from(JSON.stringify({ id, ...fields, encoding }))
+  const prefix = Buffer.alloc(12)
+  prefix.write(VERIFY_FRAME_MAGIC, 0, 'ascii')
+  prefix.writeUInt32LE(header.length, 4)
+  prefix.writeUInt32LE(bytes.length, 8)
+  return Buffer.concat([prefix, header, bytes])
+}
+
+async function sendVerifyRequest(payload, options = {}) {
   startVerifyProcess()
+  // Protocol commands are answered during model loading; frames wait for "ready"
+  if (!payload.cmd) await waitForVerifyReady()
+  return sendVerifyMessage(payload, options)
+}
+
+function sendVerifyMessage(payload, options) {
   const id = ++verifyRequestId
   return new Promise((resolve, reject) => {
     const timeout = setTimeout(() => {
@@ -80,8 +154,12 @@ function sendVerifyRequest(payload) {
       }
     })
     
-    const message = JSON.stringify({ id, ...payload }) + '\n'
+    const useBinary = options.binary && verifyBinary && payload.image
+    const message = useBinary
+      ? encodeVerifyFrame(id, payload)
+      : JSON.stringify({ id, ...payload }) + '\n'
     try {
+      if (!verifyProc) throw new Error('Verification process is not running')
       verifyProc.stdin.write(message)
     } catch (error) {
       clearTimeout(timeout)
@@ -359,7 +437,12 @@ function setupIpcHandlers() {
   // AI verification
   ipcMain.handle('verify-frame', async (event, payload) => {
     try {
-      return await sendVerifyRequest({ image: payload.image })
+      // One session per window: the server keeps only its newest queued frame
+      return await sendVerifyRequest({
+        image: payload.image,
+        session: String(event.sender.id),
+        deadline_ms: VERIFY_FRAME_DEADLINE_MS
+      }, { binary: true })
     } catch (error) {
       return { error: error.message }
     }
@@ -367,7 +450,7 @@ function setupIpcHandlers() {
 
   ipcMain.handle('enroll-identity', async (event, payload) => {
     try {
-      return await sendVerifyRequest({ image: payload.image, enroll: true })
+      return await sendVerifyRequest({ image: payload.image, enroll: true }, { binary: true })
     } catch (error) {
       return { error: error.message }
     }
@@ -407,6 +490,8 @@ async function logActivity(type, details) {
 }
 
 app.whenReady().then(async () => {
+  // Start loading the verification models while the database and window come up
+  startVerifyProcess()
   await initDatabase()
   createWindow()
 
@@ -0,0 +1,421 @@
+"""
+Proctoring pipeline benchmark - per-stage latency percentiles and throughput as JSON
+
+Drives FaceDetector.detect_faces (per backend), LivenessDetector.detect,
+IdentityMatcher.extract_embedding and the full verify_server request loop
+(JSON and binary protocols) over a fixed frame corpus. The parity stage checks
+that the ONNX Runtime path gives the same YuNet detections and SFace
+embeddings as cv2.dnn (exit status 1 on mismatch). The precision stage
+compares INT8/FP16 variants (model_quantization.py) against FP32.
+
+Usage:
+    python benchmark.py                       # synthetic corpus, all stages
+    python benchmark.py --corpus frames/ --output bench.json
+    python benchmark.py --stages detect --backends yunet,yolo
+    python benchmark.py --stages parity,detect,identity --runtimes opencv,onnxruntime
+    python benchmark.py --stages precision --precisions int8,fp16 --corpus frames/
+"""
+import sys
+import os
+import json
+import time
+import base64
+import argparse
+import platform
+import subprocess
+import cv2
+import numpy as np
+
+# Add src to path
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+sys.path.insert(0, SRC_DIR)
+
+STAGES = ["detect", "liveness", "identity", "server"]
+
+
+def log(message):
+    print(message, file=sys.stderr)
+
+
+def synthetic_corpus(count, seed, size=(640, 480)):
+    """Deterministic frames: textured background with a drifting face-like blob"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (21, 21), 0)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        cx = width // 2 + int(20 * np.sin(i / 7.0))
+        cy = height // 2 + int(10 * np.cos(i / 5.0))
+        cv2.ellipse(frame, (cx, cy), (90, 120), 0, 0, 360, (150, 170, 200), -1)
+        cv2.circle(frame, (cx - 35, cy - 30), 12, (40, 40, 40), -1)
+        cv2.circle(frame, (cx + 35, cy - 30), 12, (40, 40, 40), -1)
+        cv2.ellipse(frame, (cx, cy + 45), (40, 15), 0, 0, 180, (60, 60, 120), 3)
+        noise = rng.integers(-6, 7, frame.shape, dtype=np.int16)
+        frames.append(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def load_corpus(directory, count):
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(('.jpg', '.jpeg', '.png')))
+    frames = [cv2.imread(os.path.join(directory, n), cv2.IMREAD_COLOR) for n in names[:count]]
+    return [f for f in frames if f is not None]
+
+
+def center_box(frame, fraction=0.5):
+    height, width = frame.shape[:2]
+    bw, bh = int(width * fraction / 2), int(height * fraction / 2)
+    return (width // 2 - bw, height // 2 - bh, width // 2 + bw, height // 2 + bh)
+
+
+def summarize(stage, backend, samples_ms, wall_s):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "stage": stage,
+        "backend": backend,
+        "count": int(samples.size),
+        "throughput_fps": float(samples.size / wall_s) if wall_s > 0 else None,
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "max_ms": float(samples.max()),
+    }
+
+
+def time_calls(fn, frames, warmup):
+    """Call fn(frame) over the corpus; return per-call ms (after warm-up) and wall seconds"""
+    for frame in frames[:warmup]:
+        fn(frame)
+    samples = []
+    wall_start = time.perf_counter()
+    for frame in frames:
+        start = time.perf_counter()
+        fn(frame)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples, time.perf_counter() - wall_start
+
+
+def bench_detect(frames, backends, warmup, runtimes=("opencv",)):
+    from face_detection import FaceDetector
+
+    results = []
+    for backend in backends:
+        # Only YuNet has an ONNX Runtime path
+        for runtime in runtimes if backend == "yunet" else ("opencv",):
+            label = backend if runtime == "opencv" else f"{backend}/{runtime}"
+            try:
+                detector = FaceDetector(backend=backend, runtime=runtime)
+            except Exception as e:
+                results.append({"stage": "detect", "backend": label, "error": str(e)})
+                continue
+            samples, wall = time_calls(detector.detect_faces, frames, warmup)
+            results.append(summarize("detect", label, samples, wall))
+    return results
+
+
+def bench_liveness(frames, warmup):
+    from liveness_detection import LivenessDetector
+
+    detector = LivenessDetector()
+    box = [center_box(frames[0])]
+    samples, wall = time_calls(lambda f: detector.detect(f, box), frames, warmup)
+    return [summarize("liveness", "haar", samples, wall)]
+
+
+def bench_identity(frames, warmup, runtimes=("opencv",)):
+    from identity_match import IdentityMatcher
+
+    results = []
+    box = center_box(frames[0])
+    for runtime in runtimes:
+        try:
+            matcher = IdentityMatcher(runtime=runtime)
+        except Exception as e:
+            results.append({"stage": "identity", "backend": runtime, "error": str(e)})
+            continue
+        backend = "histogram" if matcher.use_fallback else f"sface/{runtime}"
+        samples, wall = time_calls(lambda f: matcher.extract_embedding(f, box), frames, warmup)
+        results.append(summarize("identity", backend, samples, wall))
+    return results
+
+
+def bench_precision(frames, warmup, precisions, runtimes=("opencv",)):
+    """Reduced-precision variants against FP32: embedding drift, detection agreement, speedup"""
+    from face_detection import FaceDetector
+    from face_tracker import iou_matrix
+    from identity_match import IdentityMatcher
+
+    results = []
+    box = center_box(frames[0])
+    for runtime in runtimes:
+        reference = IdentityMatcher(runtime=runtime)
+        if reference.use_fallback:
+            results.append({"stage": "precision", "backend": f"sface/{runtime}", "error": "SFace model failed to load"})
+        else:
+            ref_samples, _ = time_calls(lambda f: reference.extract_embedding(f, box), frames, warmup)
+            ref_embeddings = [reference.extract_embedding(f, box) for f in frames]
+            for precision in precisions:
+                label = f"sface/{runtime}/{precision}"
+                try:
+                    matcher = IdentityMatcher(runtime=runtime, precision=precision)
+                    if matcher.use_fallback:
+                        raise RuntimeError("model failed to load")
+                except Exception as e:
+                    results.append({"stage": "precision", "backend": label, "error": str(e)})
+                    continue
+                samples, wall = time_calls(lambda f: matcher.extract_embedding(f, box), frames, warmup)
+                cosines = [float(np.dot(a, matcher.extract_embedding(f, box))) for a, f in zip(ref_embeddings, frames)]
+                result = summarize("precision", label, samples, wall)
+                result.update({
+                    "mean_cosine": float(np.mean(cosines)),
+                    "min_cosine": float(np.min(cosines)),
+                    "speedup": float(np.median(ref_samples) / max(result["p50_ms"], 1e-9)),
+                })
+                results.append(result)
+
+        try:
+            reference = FaceDetector(backend="yunet", runtime=runtime)
+        except Exception as e:
+            results.append({"stage": "precision", "backend": f"yunet/{runtime}", "error": str(e)})
+            continue
+        ref_samples, _ = time_calls(reference.detect_faces, frames, warmup)
+        ref_boxes = [[f['bbox'] for f in reference.detect_faces(frame)['faces']] for frame in frames]
+        for precision in precisions:
+            label = f"yunet/{runtime}/{precision}"
+            try:
+                detector = FaceDetector(backend="yunet", runtime=runtime, precision=precision)
+            except Exception as e:
+                results.append({"stage": "precision", "backend": label, "error": str(e)})
+                continue
+            samples, wall = time_calls(detector.detect_faces, frames, warmup)
+            same_count, ious = 0, []
+            for expected, frame in zip(ref_boxes, frames):
+                boxes = [f['bbox'] for f in detector.detect_faces(frame)['faces']]
+                same_count += len(boxes) == len(expected)
+                if expected and boxes:
+                    # Best overlap for every FP32 face; a missed face counts as 0
+                    ious.extend(iou_matrix(expected, boxes).max(axis=1).tolist())
+                elif expected:
+                    ious.extend([0.0] * len(expected))
+            result = summarize("precision", label, samples, wall)
+            result.update({
+                "count_agreement": same_count / len(frames),
+                "mean_iou": float(np.mean(ious)) if ious else None,
+                "speedup": float(np.median(ref_samples) / max(result["p50_ms"], 1e-9)),
+            })
+            results.append(result)
+    return results
+
+
+def bench_parity(frames, embedding_tolerance=1e-4, box_tolerance_px=2):
+    """Compare ONNX Runtime against cv2.dnn output on every frame of the corpus"""
+    import onnx_runtime
+    from face_detection import FaceDetector
+    from identity_match import IdentityMatcher
+
+    if not onnx_runtime.available():
+        return [{"stage": "parity", "error": "onnxruntime not installed"}]
+
+    results = []
+    reference = IdentityMatcher(runtime="opencv")
+    candidate = IdentityMatcher(runtime="onnxruntime")
+    if reference.use_fallback or candidate.use_fallback:
+        results.append({"stage": "parity", "backend": "sface", "error": "SFace model failed to load"})
+    else:
+        max_diff, min_cosine = 0.0, 1.0
+        for frame in frames:
+            box = center_box(frame)
+            a = reference.extract_embedding(frame, box)
+            b = candidate.extract_embedding(frame, box)
+            max_diff = max(max_diff, float(np.abs(a - b).max()))
+            min_cosine = min(min_cosine, float(np.dot(a, b)))
+        results.append({
+            "stage": "parity",
+            "backend": "sface",
+            "count": len(frames),
+            "max_abs_diff": max_diff,
+            "min_cosine": min_cosine,
+            "passed": max_diff <= embedding_tolerance,
+        })
+
+    try:
+        reference = FaceDetector(backend="yunet", runtime="opencv")
+        candidate = FaceDetector(backend="yunet", runtime="onnxruntime")
+    except Exception as e:
+        results.append({"stage": "parity", "backend": "yunet", "error": str(e)})
+        return results
+
+    count_mismatches, max_box_diff, faces = 0, 0, 0
+    for frame in frames:
+        a = sorted(reference.detect_faces(frame)['faces'], key=lambda f: f['bbox'])
+        b = sorted(candidate.detect_faces(frame)['faces'], key=lambda f: f['bbox'])
+        if len(a) != len(b):
+            count_mismatches += 1
+            continue
+        faces += len(a)
+        for fa, fb in zip(a, b):
+            max_box_diff = max(max_box_diff, int(np.abs(np.subtract(fa['bbox'], fb['bbox'])).max()))
+    results.append({
+        "stage": "parity",
+        "backend": "yunet",
+        "count": len(frames),
+        "faces": faces,
+        "count_mismatches": count_mismatches,
+        "max_box_diff_px": max_box_diff,
+        "passed": count_mismatches == 0 and max_box_diff <= box_tolerance_px,
+    })
+    return results
+
+
+class ServerClient:
+    """Minimal verify_server client speaking JSON lines or binary frames"""
+    def __init__(self, args=()):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.join(SRC_DIR, "verify_server.py"), *args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.next_id = 0
+
+    def request(self, payload: bytes, req_id):
+        self.proc.stdin.write(payload)
+        self.proc.stdin.flush()
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError("verify_server exited")
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue  # stray log line
+            if isinstance(msg, dict) and msg.get("id") == req_id:
+                return msg
+
+    def call(self, fields: dict, image_bytes=None):
+        from frame_protocol import encode_binary_frame
+
+        self.next_id += 1
+        req = dict(fields, id=self.next_id)
+        if image_bytes is None:
+            payload = (json.dumps(req) + "\n").encode("utf-8")
+        else:
+            payload = encode_binary_frame(req, image_bytes)
+        return self.request(payload, self.next_id)
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait(timeout=10)
+
+
+def bench_server(frames, warmup):
+    encoded = [cv2.imencode(".jpg", f, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes() for f in frames]
+    data_urls = ["data:image/jpeg;base64," + base64.b64encode(b).decode("ascii") for b in encoded]
+
+    start = time.perf_counter()
+    client = ServerClient()
+    results = []
+    try:
+        hello = client.call({"cmd": "hello"})
+        startup_ms = (time.perf_counter() - start) * 1000.0
+        results.append({"stage": "server_startup", "backend": "stdio", "startup_ms": startup_ms})
+
+        protocols = {"json": lambda i: client.call({"image": data_urls[i]})}
+        if "binary" in hello.get("protocols", []):
+            protocols["binary"] = lambda i: client.call({"encoding": "jpeg"}, encoded[i])
+
+        for name, send in protocols.items():
+            indices = list(range(len(frames)))
+            samples, wall = time_calls(send, indices, warmup)
+            results.append(summarize("server", name, samples, wall))
+    finally:
+        client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the proctoring pipeline")
+    parser.add_argument("--frames", type=int, default=200, help="Frames in the corpus")
+    parser.add_argument("--corpus", help="Directory of .jpg/.png frames (default: synthetic)")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for the synthetic corpus")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed calls before each stage")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--backends", default="yunet,yolo", help="Detection backends to compare")
+    parser.add_argument("--runtimes", default="opencv",
+                        help="Runtimes for the ONNX models, e.g. opencv,onnxruntime")
+    parser.add_argument("--precisions", default="int8,fp16",
+                        help="Variants compared against FP32 by the precision stage")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.corpus:
+        frames = load_corpus(args.corpus, args.frames)
+    else:
+        frames = synthetic_corpus(args.frames, args.seed)
+    if not frames:
+        log("✗ Empty corpus")
+        sys.exit(1)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "frames": len(frames),
+            "frame_size": list(frames[0].shape[:2][::-1]),
+            "corpus": args.corpus or f"synthetic(seed={args.seed})",
+            "warmup": args.warmup,
+        },
+        "results": [],
+    }
+
+    runtimes = [r.strip() for r in args.runtimes.split(",") if r.strip()]
+    runners = {
+        "detect": lambda: bench_detect(frames, [b.strip() for b in args.backends.split(",")], args.warmup, runtimes),
+        "liveness": lambda: bench_liveness(frames, args.warmup),
+        "identity": lambda: bench_identity(frames, args.warmup, runtimes),
+        "server": lambda: bench_server(frames, args.warmup),
+        "parity": lambda: bench_parity(frames),
+        "precision": lambda: bench_precision(
+            frames, args.warmup, [p.strip() for p in args.precisions.split(",") if p.strip() and p.strip() != "fp32"], runtimes),
+    }
+    for stage in stages:
+        if stage not in runners:
+            log(f"⊘ Unknown stage: {stage}")
+            continue
+        log(f"Running {stage}...")
+        try:
+            report["results"].extend(runners[stage]())
+        except Exception as e:
+            report["results"].append({"stage": stage, "error": str(e)})
+
+    for result in report["results"]:
+        if "p50_ms" in result:
+            line = (f"  {result['stage']:>9} [{result['backend']}] "
+                    f"p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms "
+                    f"p99={result['p99_ms']:.2f}ms {result['throughput_fps']:.1f} fps")
+            if "speedup" in result:
+                line += f" {result['speedup']:.2f}x"
+            log(line)
+        elif "passed" in result:
+            log(f"  {result['stage']:>9} [{result['backend']}] {'✓ match' if result['passed'] else '✗ MISMATCH'}")
+        elif "error" in result:
+            log(f"  {result['stage']:>9} [{result.get('backend', '-')}] ✗ {result['error']}")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        log(f"✓ Report written to {args.output}")
+    else:
+        print(output)
+
+    if any(result.get("passed") is False for result in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
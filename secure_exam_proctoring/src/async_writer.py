@@ -0,0 +1,276 @@
+"""
+Async Writer - background disk I/O off the frame-processing path
+
+Writes are queued (bounded) and executed in FIFO order by one thread, so a
+slow disk (antivirus scans, HDDs) delays the writer, never the caller. Each
+call returns a concurrent.futures.Future. Appends to the same file within a
+batch share one open/flush/fsync.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+import numpy as np
+from server_stats import LatencyHistogram
+
+
+FSYNC_POLICIES = ("never", "batch", "always")
+
+
+class _Op:
+    __slots__ = ("kind", "path", "data", "fn", "args", "kwargs", "future", "queued_at")
+
+    def __init__(self, kind, path=None, data=None, fn=None, args=(), kwargs=None):
+        self.kind = kind
+        self.path = path
+        self.data = data
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+
+
+_STOP = object()
+
+
+class AsyncWriter:
+    def __init__(self, max_queue=1024, batch_size=64, fsync="batch", stats=None, name="async-writer"):
+        """
+        Start the writer thread
+
+        Args:
+            max_queue: Operations queued before submit blocks (or drops, with block=False)
+            batch_size: Operations drained per batch
+            fsync: "never", "batch" (each touched file once per batch) or "always" (every write)
+            stats: Optional ServerStats that also receives "disk_write" latencies
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.stats = stats
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.pid = os.getpid()
+
+        self.write_latency = LatencyHistogram()  # execution time per operation
+        self.queue_latency = LatencyHistogram()  # time spent waiting in the queue
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "dropped": 0,
+                         "bytes": 0, "batches": 0, "fsyncs": 0}
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # Submission
+
+    def _submit(self, op, block=True):
+        if self._closed:
+            raise RuntimeError("AsyncWriter is closed")
+        try:
+            self._queue.put(op, block=block)
+        except queue.Full:
+            self._incr("dropped")
+            op.future.set_exception(queue.Full("write queue full"))
+            return op.future
+        self._incr("submitted")
+        return op.future
+
+    def write_bytes(self, path, data, block=True):
+        """Atomically replace path with data"""
+        return self._submit(_Op("write", str(path), bytes(data)), block)
+
+    def append_bytes(self, path, data, block=True):
+        return self._submit(_Op("append", str(path), bytes(data)), block)
+
+    def write_json(self, path, obj, block=True, **dump_kwargs):
+        """Serialize on the writer thread; pass an object the caller will not mutate"""
+        return self._submit(_Op("json", str(path), obj, kwargs=dump_kwargs), block)
+
+    def save_npy(self, path, array, block=True):
+        return self._submit(_Op("npy", str(path), np.array(array, copy=True)), block)
+
+    def call(self, fn, *args, block=True, **kwargs):
+        """Run fn(*args, **kwargs) on the writer thread, after every write queued before it"""
+        return self._submit(_Op("call", fn=fn, args=args, kwargs=kwargs), block)
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written"""
+        if self._closed:
+            return
+        self.call(lambda: None).result(timeout)
+
+    def close(self, timeout=None):
+        """Drain the queue, then stop the thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def get_stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            write = self.write_latency.snapshot()
+            wait = self.queue_latency.snapshot()
+        return dict(counters, queue_depth=self.pending(), fsync=self.fsync,
+                    write_latency_ms=write, queue_latency_ms=wait)
+
+    # Writer thread
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(op is _STOP for op in batch)
+            self._execute([op for op in batch if op is not _STOP])
+            if stop:
+                # close() queued the sentinel last; anything still queued was submitted before it
+                remaining = []
+                while True:
+                    try:
+                        op = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if op is not _STOP:
+                        remaining.append(op)
+                self._execute(remaining)
+                return
+
+    def _execute(self, ops):
+        if not ops:
+            return
+        appends = {}  # path -> open file, shared by consecutive appends in this batch
+        written = []  # (op, start, size) of appends, resolved once their file is flushed
+        try:
+            for op in ops:
+                if op.kind != "append" and appends:
+                    # Later operations (e.g. a report streamed from the log) must see the appends
+                    self._finish_appends(appends, written)
+                start = time.perf_counter()
+                try:
+                    if op.kind == "append":
+                        f = appends.get(op.path)
+                        if f is None:
+                            os.makedirs(os.path.dirname(os.path.abspath(op.path)), exist_ok=True)
+                            f = appends[op.path] = open(op.path, "ab")
+                        f.write(op.data)
+                        if self.fsync == "always":
+                            self._sync(f)
+                        written.append((op, start, len(op.data)))
+                        continue
+                    elif op.kind == "call":
+                        result = op.fn(*op.args, **op.kwargs)
+                    else:
+                        result = self._replace(op)
+                except Exception as e:
+                    self._fail(op, e)
+                    continue
+                self._record(op, start, result)
+        finally:
+            self._finish_appends(appends, written)
+            self._incr("batches")
+
+    def _finish_appends(self, files, written):
+        failed = {}
+        for path, f in files.items():
+            try:
+                if self.fsync == "batch":
+                    self._sync(f)
+                f.close()
+            except OSError as e:
+                failed[path] = e
+        files.clear()
+        for op, start, size in written:
+            if op.path in failed:
+                self._fail(op, failed[op.path])
+            else:
+                self._record(op, start, size)
+        written.clear()
+
+    def _fail(self, op, error):
+        self._incr("failed")
+        print(f"⚠ Background write failed ({op.path or op.fn}): {error}", file=sys.stderr)
+        op.future.set_exception(error)
+
+    def _replace(self, op):
+        """Write to a temporary file, then rename over the target so readers never see half a file"""
+        os.makedirs(os.path.dirname(os.path.abspath(op.path)), exist_ok=True)
+        tmp_path = f"{op.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            if op.kind == "write":
+                f.write(op.data)
+            elif op.kind == "json":
+                f.write(json.dumps(op.data, **op.kwargs).encode("utf-8"))
+            elif op.kind == "npy":
+                np.save(f, op.data)
+            size = f.tell()
+            if self.fsync != "never":
+                self._sync(f)
+        os.replace(tmp_path, op.path)
+        return size
+
+    def _sync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+        self._incr("fsyncs")
+
+    def _record(self, op, start, result):
+        now = time.perf_counter()
+        write_ms = (now - start) * 1000.0
+        with self._lock:
+            self.write_latency.observe(write_ms)
+            self.queue_latency.observe((start - op.queued_at) * 1000.0)
+            self.counters["completed"] += 1
+            if op.kind != "call" and isinstance(result, int):
+                self.counters["bytes"] += result
+        if self.stats is not None:
+            self.stats.observe("disk_write", write_ms)
+        op.future.set_result(result)
+
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+
+def get_writer(**options):
+    """
+    Process-wide writer shared by every component; flushed at interpreter exit
+
+    Args:
+        options: AsyncWriter arguments, used only when the writer is first created
+    """
+    global _default_writer
+    with _default_lock:
+        # A forked child inherits the object but not its thread
+        if _default_writer is None or _default_writer.pid != os.getpid():
+            _default_writer = AsyncWriter(**options)
+            atexit.register(_default_writer.close)
+        return _default_writer
+
+
+def close_writer(timeout=None):
+    """Flush and stop the process-wide writer (worker processes exit without atexit hooks)"""
+    global _default_writer
+    with _default_lock:
+        writer, _default_writer = _default_writer, None
+    if writer is not None and writer.pid == os.getpid():
+        writer.close(timeout)
@@ -0,0 +1,297 @@
+"""
+Batch Review - re-process recorded exam videos offline on a process pool
+
+Each video is split into time-range chunks; every worker process loads the
+models once and runs a fresh ProctoringService per chunk, with frames decoded
+on a separate thread. Chunk results are merged back in order and written as
+one report per video, in the same format as ProctoringService.export_report.
+
+Usage:
+    python batch_review.py recordings/ reports/
+    python batch_review.py recordings/ reports/ --workers 8 --chunk-seconds 120
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import traceback
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+import cv2
+import numpy as np
+
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".webm")
+
+# Per-process models, loaded once by _init_worker
+_models = None
+# Why _init_worker failed, if it did (re-raised by every task)
+_init_error = None
+
+
+class ModelLoadError(Exception):
+    """Raised when a worker process cannot load the models; aborts the review"""
+
+
+class FrameReader(threading.Thread):
+    """Decodes a frame range on its own thread so inference never waits on the codec"""
+    def __init__(self, path, start_frame, end_frame, queue_size=32):
+        super().__init__(daemon=True)
+        self.path = path
+        self.start_frame = start_frame
+        self.end_frame = end_frame  # exclusive; None = until the end of the video
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.error = None
+
+    def run(self):
+        cap = cv2.VideoCapture(self.path)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"Cannot open video {self.path}")
+            if self.start_frame:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            index = self.start_frame
+            while self.end_frame is None or index < self.end_frame:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self.frames.put((index, frame))
+                index += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            cap.release()
+            self.frames.put(None)
+
+    def __iter__(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                if self.error:
+                    raise self.error
+                return
+            yield item
+
+
+def probe_video(path):
+    """Return (frame_count, fps); frame_count is 0 when the container does not say"""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise IOError(f"Cannot open video {path}")
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    finally:
+        cap.release()
+    return max(frame_count, 0), fps
+
+
+def plan_chunks(path, chunk_seconds, warmup_seconds):
+    """
+    Split a video into (path, index, start, end, warmup_start, fps) tasks
+
+    Chunks start decoding warmup_seconds early so violation rule windows, tracking
+    and liveness history are primed; violations before 'start' are discarded
+    because the previous chunk reports them.
+    """
+    frame_count, fps = probe_video(path)
+    if frame_count == 0:
+        return [(path, 0, 0, None, 0, fps)]
+
+    chunk_frames = max(1, int(round(chunk_seconds * fps)))
+    warmup_frames = int(round(warmup_seconds * fps))
+    tasks = []
+    for index, start in enumerate(range(0, frame_count, chunk_frames)):
+        end = min(start + chunk_frames, frame_count)
+        tasks.append((path, index, start, end, max(0, start - warmup_frames), fps))
+    return tasks
+
+
+def _init_worker(model_path, reference_path, rules_path=None):
+    global _models, _init_error
+    # One process per core already; OpenCV's own thread pool would only oversubscribe
+    cv2.setNumThreads(1)
+    try:
+        from face_detection import FaceDetector
+        from liveness_detection import LivenessDetector
+        from identity_match import IdentityMatcher
+        from violation_rules import load_rules
+
+        _models = {
+            "detector": FaceDetector(model_path=model_path),
+            "liveness": LivenessDetector(),
+            "identity_matcher": IdentityMatcher(),
+            "reference_embedding": np.load(reference_path) if reference_path else None,
+            "rules": load_rules(rules_path) if rules_path else None,
+        }
+    except Exception as e:
+        # Raising here would kill the worker, and the pool would respawn it forever
+        _init_error = f"{type(e).__name__}: {e}"
+        traceback.print_exc(file=sys.stderr)
+
+
+def process_chunk(task):
+    """
+    Run one chunk, catching its errors so one bad video cannot end the review
+
+    Returns:
+        tuple: (path, index, frames, violations, error); error is None or a message
+    """
+    if _init_error is not None:
+        raise ModelLoadError(f"Worker could not load the models: {_init_error}")
+
+    path, index = task[:2]
+    try:
+        frames, violations = _run_chunk(*task)
+    except Exception as e:
+        return path, index, 0, [], f"chunk {index}: {type(e).__name__}: {e}"
+    return path, index, frames, violations, None
+
+
+def _run_chunk(path, index, start, end, warmup_start, fps):
+    """Run one chunk through a fresh ProctoringService; returns (frames, violations)"""
+    from proctoring_service import ProctoringService
+
+    service = ProctoringService(
+        detector=_models["detector"],
+        liveness=_models["liveness"],
+        identity_matcher=_models["identity_matcher"],
+        reference_embedding=_models["reference_embedding"],
+        rules=_models["rules"],
+        log_dir=None,
+    )
+    service.start_proctoring(Path(path).stem)
+
+    reader = FrameReader(path, warmup_start, end)
+    reader.start()
+    frames = 0
+    violations = []
+    for frame_index, frame in reader:
+        seen = len(service.violations)
+        # Video time drives sampling and identity re-check intervals
+        service.process_frame(frame, timestamp=frame_index / fps)
+        if frame_index < start:
+            continue
+        frames += 1
+        for violation in service.violations.tail(len(service.violations) - seen):
+            violation = dict(violation, frame=frame_index + 1, video_time=round(frame_index / fps, 3))
+            violation.pop('seq', None)
+            violations.append(violation)
+    service.violations.close()
+    service.writer.flush()  # the pool may terminate this process before the next chunk
+    return frames, violations
+
+
+def write_report(filepath, exam_id, total_frames, violations):
+    """Same layout as ProctoringService.export_report"""
+    report = {
+        'exam_id': exam_id,
+        'total_frames': total_frames,
+        'violations': violations,
+        'timestamp': datetime.now().isoformat()
+    }
+    with open(filepath, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def review(videos, output_dir, workers=None, chunk_seconds=60.0, warmup_seconds=2.0,
+           model_path="models/yolov8n-face.pt", reference_path=None, rules_path=None):
+    """
+    Re-process videos and write <stem>_report.json for each into output_dir
+
+    Returns:
+        dict: video path -> {'frames', 'violations', 'report', 'errors'}; a video with
+              errors gets a report of the chunks that did succeed, or none if it
+              could not be read at all
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    tasks = []
+    chunk_counts = {}
+    summary = {}
+    for video in videos:
+        try:
+            video_tasks = plan_chunks(str(video), chunk_seconds, warmup_seconds)
+        except Exception as e:
+            summary[str(video)] = {'frames': 0, 'violations': 0, 'report': None, 'errors': [str(e)]}
+            print(f"⚠ {Path(video).name}: {e}", file=sys.stderr)
+            continue
+        chunk_counts[str(video)] = len(video_tasks)
+        tasks.extend(video_tasks)
+    print(f"Reviewing {len(chunk_counts)} videos as {len(tasks)} chunks", file=sys.stderr)
+
+    pending = {path: {} for path in chunk_counts}
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(model_path, reference_path, rules_path)) as pool:
+        # Chunks finish out of order; each video is assembled once all of its chunks are in.
+        # A ModelLoadError from the first task ends the review (leaving the pool terminates it)
+        for path, index, frames, violations, error in pool.imap_unordered(process_chunk, tasks):
+            pending[path][index] = (frames, violations, error)
+            if len(pending[path]) < chunk_counts[path]:
+                continue
+
+            chunks = [chunk for _, chunk in sorted(pending.pop(path).items())]
+            errors = [chunk[2] for chunk in chunks if chunk[2] is not None]
+            entry = {'frames': 0, 'violations': 0, 'report': None, 'errors': errors}
+            summary[path] = entry
+            if len(errors) == len(chunks):
+                print(f"⚠ {Path(path).name}: {errors[0]}", file=sys.stderr)
+                continue
+
+            total_frames = sum(chunk[0] for chunk in chunks)
+            merged = [v for chunk in chunks for v in chunk[1]]
+            report_path = output_dir / f"{Path(path).stem}_report.json"
+            write_report(report_path, Path(path).stem, total_frames, merged)
+            entry.update(frames=total_frames, violations=len(merged), report=str(report_path))
+            if errors:
+                print(f"⚠ {Path(path).name}: {total_frames} frames, {len(merged)} violations, "
+                      f"{len(errors)} chunk(s) failed: {'; '.join(errors)}", file=sys.stderr)
+            else:
+                print(f"✓ {Path(path).name}: {total_frames} frames, {len(merged)} violations", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    frames = sum(s['frames'] for s in summary.values())
+    print(f"✓ Reviewed {frames} frames in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.1f} fps)", file=sys.stderr)
+    failed = sum(1 for s in summary.values() if s['errors'])
+    if failed:
+        print(f"⚠ {failed} of {len(summary)} videos had errors", file=sys.stderr)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-process recorded exam videos offline")
+    parser.add_argument("videos", help="Directory of recorded exam videos")
+    parser.add_argument("output", help="Directory for the per-video violation reports")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0, help="Video time per work unit")
+    parser.add_argument("--warmup-seconds", type=float, default=2.0,
+                        help="Video time decoded before each chunk to prime violation rule windows")
+    parser.add_argument("--model", default="models/yolov8n-face.pt", help="Face detection model")
+    parser.add_argument("--reference", help="Reference embedding (.npy) for identity checks")
+    parser.add_argument("--rules", help="Violation rules (JSON list, see violation_rules.py)")
+    args = parser.parse_args()
+
+    videos = sorted(p for p in Path(args.videos).iterdir() if p.suffix.lower() in VIDEO_EXTENSIONS)
+    if not videos:
+        print(f"No videos found in {args.videos}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        summary = review(videos, args.output, workers=args.workers, chunk_seconds=args.chunk_seconds,
+                         warmup_seconds=args.warmup_seconds, model_path=args.model, reference_path=args.reference,
+                         rules_path=args.rules)
+    except ModelLoadError as e:
+        print(f"⚠ {e}", file=sys.stderr)
+        sys.exit(1)
+    if any(s['errors'] for s in summary.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
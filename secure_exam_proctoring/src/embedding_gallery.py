@@ -0,0 +1,126 @@
+"""
+Embedding Gallery - enrolled identities stored as one pre-normalized matrix
+
+On disk a gallery is a directory holding:
+    embeddings.npy  (N x D, float32 or float16, rows L2-normalized)
+    ids.json        list of N identity ids, row order
+"""
+import sys
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+
+
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.json"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-8)
+
+
+class EmbeddingGallery:
+    def __init__(self, matrix: np.ndarray, ids):
+        """
+        Wrap an already normalized embedding matrix
+
+        Args:
+            matrix: (N, D) array, rows L2-normalized (may be a read-only memmap)
+            ids: N identity ids in row order
+        """
+        if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+            raise ValueError(f"Gallery shape {matrix.shape} does not match {len(ids)} ids")
+        self.matrix = matrix
+        self.ids = list(ids)
+        self._index = {identity: row for row, identity in enumerate(self.ids)}
+
+    @classmethod
+    def build(cls, ids, embeddings, dtype=np.float32):
+        """Create a gallery from raw embeddings, normalizing once up front"""
+        matrix = normalize_rows(np.vstack([np.ravel(e) for e in embeddings]))
+        return cls(np.ascontiguousarray(matrix, dtype=dtype), ids)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Load a saved gallery
+
+        Args:
+            directory: Gallery directory
+            mmap: Memory-map the matrix instead of reading it into RAM
+        """
+        directory = Path(directory)
+        matrix = np.load(str(directory / EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        with open(directory / IDS_FILE, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(matrix, ids)
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(str(directory / EMBEDDINGS_FILE), np.ascontiguousarray(self.matrix))
+        with open(directory / IDS_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.ids, f)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def index_of(self, identity):
+        return self._index.get(identity)
+
+    def scores(self, probes: np.ndarray, block_rows=8192) -> np.ndarray:
+        """
+        Cosine similarity of every probe against every identity
+
+        Args:
+            probes: (P, D) float32 array, rows L2-normalized
+            block_rows: Gallery rows multiplied per step; float16 blocks are
+                        upcast one at a time so BLAS is used without copying the whole matrix
+
+        Returns:
+            np.ndarray: (P, N) float32 similarity matrix
+        """
+        if probes.shape[1] != self.dim:
+            raise ValueError(f"Probe dimension {probes.shape[1]} does not match gallery dimension {self.dim}")
+
+        if self.matrix.dtype == np.float32 and len(self) <= block_rows:
+            return probes @ self.matrix.T
+
+        out = np.empty((probes.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), block_rows):
+            block = np.asarray(self.matrix[start:start + block_rows], dtype=np.float32)
+            np.matmul(probes, block.T, out=out[:, start:start + len(block)])
+        return out
+
+
+def main():
+    """Build a gallery directory from per-identity .npy files (file stem = identity id)"""
+    parser = argparse.ArgumentParser(description="Build an enrolled embedding gallery")
+    parser.add_argument("source", help="Directory of <identity>.npy embedding files")
+    parser.add_argument("output", help="Gallery directory to write")
+    parser.add_argument("--float16", action="store_true", help="Store the matrix as float16")
+    args = parser.parse_args()
+
+    files = sorted(Path(args.source).glob("*.npy"))
+    if not files:
+        print(f"No .npy files found in {args.source}", file=sys.stderr)
+        sys.exit(1)
+
+    gallery = EmbeddingGallery.build(
+        [f.stem for f in files],
+        [np.load(str(f)) for f in files],
+        dtype=np.float16 if args.float16 else np.float32,
+    )
+    gallery.save(args.output)
+    print(f"✓ Gallery saved to {args.output} ({len(gallery)} identities, dim {gallery.dim}, {gallery.matrix.dtype})")
+
+
+if __name__ == "__main__":
+    main()
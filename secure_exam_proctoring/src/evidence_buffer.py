@@ -0,0 +1,170 @@
+"""
+Evidence Buffer - last few seconds of frames as JPEG, saved around violations
+
+Frames are downscaled, JPEG-encoded at a capped rate and copied into slots of
+one preallocated array, so memory use is fixed no matter how long the exam
+runs (about 88 KB per session with the defaults: 11 slots of 8 KB). A violation schedules a snapshot; once the post-violation window has
+been recorded, every frame in [t - pre, t + post] is written to disk (through
+an AsyncWriter when one is given, so the frame loop never waits on the disk).
+"""
+import os
+import sys
+import json
+import math
+import cv2
+import numpy as np
+
+
+class _PendingSnapshot:
+    def __init__(self, directory, timestamp, until, meta):
+        self.directory = directory
+        self.timestamp = timestamp
+        self.until = until
+        self.meta = meta
+
+
+class EvidenceRingBuffer:
+    def __init__(self, pre_seconds=3.0, post_seconds=2.0, fps=2.0, max_width=240,
+                 jpeg_quality=60, slot_bytes=8 * 1024, writer=None):
+        """
+        Preallocate the ring
+
+        Args:
+            pre_seconds: Seconds of frames kept before a violation
+            post_seconds: Seconds recorded after a violation before it is written out
+            fps: Frames stored per second (others are not encoded at all)
+            max_width: Frames are downscaled to at most this width before encoding
+            jpeg_quality: JPEG quality (0-100)
+            slot_bytes: Bytes reserved per frame; larger encodings are retried at lower quality
+            writer: AsyncWriter for snapshot files (None = write inline)
+        """
+        self.writer = writer
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.min_interval = 1.0 / fps
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+
+        self.capacity = int(math.ceil((pre_seconds + post_seconds) * fps)) + 1
+        self._data = np.empty((self.capacity, slot_bytes), dtype=np.uint8)
+        self._sizes = np.zeros(self.capacity, dtype=np.int64)
+        self._timestamps = np.full(self.capacity, -np.inf)
+        self._frames = np.zeros(self.capacity, dtype=np.int64)
+        self._next = 0
+        self._last_stored = -np.inf
+        self._pending = []
+
+        self.stored = 0
+        self.oversize = 0
+        self.snapshots = 0
+
+    @property
+    def memory_bytes(self):
+        return self._data.nbytes
+
+    def add(self, frame, frame_number, timestamp):
+        """Store the frame if it is due; returns True when it was stored"""
+        if timestamp - self._last_stored < self.min_interval:
+            return False
+        self._last_stored = timestamp
+
+        height, width = frame.shape[:2]
+        if width > self.max_width:
+            scale = self.max_width / float(width)
+            frame = cv2.resize(frame, (self.max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        slot_bytes = self._data.shape[1]
+        quality = self.jpeg_quality
+        encoded = None
+        for _ in range(2):
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok and buf.size <= slot_bytes:
+                encoded = buf.reshape(-1)
+                break
+            quality //= 2
+        if encoded is None:
+            self.oversize += 1
+            return False
+
+        slot = self._next
+        self._data[slot, :encoded.size] = encoded
+        self._sizes[slot] = encoded.size
+        self._timestamps[slot] = timestamp
+        self._frames[slot] = frame_number
+        self._next = (slot + 1) % self.capacity
+        self.stored += 1
+        return True
+
+    def snapshot(self, directory, timestamp, meta=None):
+        """
+        Schedule the window around timestamp to be written into directory
+
+        Returns:
+            str: The directory, to link from the violation entry
+        """
+        self._pending.append(_PendingSnapshot(str(directory), timestamp, timestamp + self.post_seconds, meta or {}))
+        return str(directory)
+
+    def poll(self, timestamp):
+        """Write out snapshots whose post-violation window has been recorded"""
+        if not self._pending:
+            return
+        ready = [s for s in self._pending if timestamp >= s.until]
+        if ready:
+            self._pending = [s for s in self._pending if timestamp < s.until]
+            for snap in ready:
+                self._write(snap)
+
+    def flush(self):
+        """Write every pending snapshot with whatever frames are available (e.g. at session end)"""
+        pending, self._pending = self._pending, []
+        for snap in pending:
+            self._write(snap)
+
+    def _write(self, snap):
+        start = snap.timestamp - self.pre_seconds
+        slots = np.flatnonzero((self._timestamps >= start) & (self._timestamps <= snap.until))
+        slots = slots[np.argsort(self._timestamps[slots])]
+        frames = []
+        try:
+            if not self.writer:
+                os.makedirs(snap.directory, exist_ok=True)
+            for slot in slots:
+                name = f"frame_{int(self._frames[slot]):06d}.jpg"
+                # tobytes() copies: the slot may be overwritten before a queued write runs
+                self._save(os.path.join(snap.directory, name), self._data[slot, :self._sizes[slot]].tobytes())
+                frames.append({
+                    'file': name,
+                    'frame': int(self._frames[slot]),
+                    'offset_s': round(float(self._timestamps[slot] - snap.timestamp), 3),
+                })
+            index = json.dumps(dict(snap.meta, frames=frames), indent=2).encode("utf-8")
+            self._save(os.path.join(snap.directory, "index.json"), index)
+            self.snapshots += 1
+        except OSError as e:
+            print(f"⚠ Evidence snapshot failed ({snap.directory}): {e}", file=sys.stderr)
+
+    def _save(self, path, data):
+        if self.writer:
+            # Evidence is best effort: drop rather than stall the frame loop on a full queue
+            self.writer.write_bytes(path, data, block=False)
+        else:
+            with open(path, "wb") as f:
+                f.write(data)
+
+    def reset(self):
+        self._sizes[:] = 0
+        self._timestamps[:] = -np.inf
+        self._next = 0
+        self._last_stored = -np.inf
+        self._pending = []
+
+    def get_stats(self):
+        return {
+            'capacity': self.capacity,
+            'memory_bytes': self.memory_bytes,
+            'stored': self.stored,
+            'oversize': self.oversize,
+            'snapshots': self.snapshots,
+            'pending': len(self._pending),
+        }
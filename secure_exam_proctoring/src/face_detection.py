@@ -1,76 +1,214 @@
-from ultralytics import YOLO
 import cv2
 import os
+import sys
+import time
+import numpy as np
 from pathlib import Path
-from model_registry import ensure_models, get_model_path
+from model_registry import ensure_models, get_model_path, get_variant_path, load_model
+from onnx_runtime import RUNTIMES, yunet_detect
+
+
+YOLO_MODEL = "yolov8n-face.pt"
+YUNET_MODEL = "face_detection_yunet_2023mar.onnx"
+
+
+class DetectionBackend:
+    """
+    Interface for face detection backends used by FaceDetector.
+    detect() returns a list of face dicts: {'bbox': (x1, y1, x2, y2), 'confidence': float, ...}
+    input_size is the long side (pixels) the model effectively works at; larger
+    frames only cost decode and resize time.
+    """
+    name = None
+    input_size = None
+
+    def detect(self, frame, confidence):
+        raise NotImplementedError
+
+    def detect_batch(self, frames, confidence):
+        """Detect faces in several frames; backends that can batch override this"""
+        return [self.detect(frame, confidence) for frame in frames]
+
+
+def _faces_from_arrays(boxes, scores):
+    """Build face dicts from an (N, 4) xyxy array and an (N,) score array in one pass"""
+    boxes = boxes.astype(int).tolist()
+    scores = scores.tolist()
+    return [
+        {'bbox': tuple(box), 'confidence': score}
+        for box, score in zip(boxes, scores)
+    ]
+
+
+class YoloBackend(DetectionBackend):
+    """Ultralytics YOLOv8 face model (.pt); pulls in torch, so it is imported lazily"""
+    name = "yolo"
+    input_size = 640  # Ultralytics letterboxes to imgsz=640
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.model  # load now so failures surface at construction
+
+        # Log to stderr only (safe for JSON communication)
+        print(f"✓ YOLOv8 Face model loaded", file=sys.stderr)
+
+    @property
+    def model(self):
+        # Shared through the model cache; one instance per calling thread
+        return load_model(YOLO_MODEL, path=self.model_path, kind="yolo")
+
+    def detect(self, frame, confidence):
+        return self.detect_batch([frame], confidence)[0]
+
+    def detect_batch(self, frames, confidence):
+        import torch
+
+        results = self.model(list(frames), conf=confidence, verbose=False)
+        counts = [0 if r.boxes is None else len(r.boxes) for r in results]
+        if not any(counts):
+            return [[] for _ in results]
+
+        # One device-to-host copy for every box in the batch.
+        # Boxes.data columns: x1, y1, x2, y2, [track id], conf, cls
+        data = torch.cat([r.boxes.data for r, n in zip(results, counts) if n]).cpu().numpy()
+        per_frame = np.split(data, np.cumsum(counts)[:-1])
+        return [_faces_from_arrays(chunk[:, :4], chunk[:, -2]) for chunk in per_frame]
+
+
+class YuNetBackend(DetectionBackend):
+    """OpenCV YuNet (cv2.FaceDetectorYN) - small ONNX model, CPU friendly, no torch"""
+    name = "yunet"
+    # Runs at the frame's own size; 640 keeps webcam-distance faces well above its ~10 px minimum
+    input_size = 640
+
+    def __init__(self, model_path, nms_threshold=0.3, top_k=5000, runtime="opencv"):
+        self.model_path = model_path
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self.runtime = runtime
+        self.model  # load now so failures surface at construction
+        print(f"✓ YuNet Face model loaded ({runtime})", file=sys.stderr)
+
+    @property
+    def model(self):
+        # Shared through the model cache; one cv2 instance per calling thread
+        kind = "ort" if self.runtime == "onnxruntime" else "yunet"
+        return load_model(YUNET_MODEL, path=self.model_path, kind=kind)
+
+    def detect(self, frame, confidence):
+        height, width = frame.shape[:2]
+        if self.runtime == "onnxruntime":
+            rows = yunet_detect(self.model, frame, confidence, self.nms_threshold, self.top_k)
+        else:
+            rows = self._detect_opencv(frame, confidence)
+        if rows is None or len(rows) == 0:
+            return []
+
+        # Each row: x, y, w, h, 5 landmark (x, y) pairs, score
+        boxes = rows[:, :4].copy()
+        boxes[:, 2:] += boxes[:, :2]
+        boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, width)
+        boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, height)
+        faces = _faces_from_arrays(boxes, rows[:, 14])
+
+        # right eye, left eye, nose tip, right mouth corner, left mouth corner
+        landmarks = rows[:, 4:14].reshape(-1, 5, 2).astype(int).tolist()
+        for face, points in zip(faces, landmarks):
+            face['landmarks'] = [tuple(point) for point in points]
+        return faces
+
+    def _detect_opencv(self, frame, confidence):
+        model = self.model
+        height, width = frame.shape[:2]
+        # The instance may be shared with other detectors, so read its settings back
+        if tuple(model.getInputSize()) != (width, height):
+            model.setInputSize((width, height))
+        if model.getScoreThreshold() != confidence:
+            model.setScoreThreshold(confidence)
+        if model.getNMSThreshold() != self.nms_threshold:
+            model.setNMSThreshold(self.nms_threshold)
+        if model.getTopK() != self.top_k:
+            model.setTopK(self.top_k)
+
+        _, rows = model.detect(frame)
+        return rows
+
+
+BACKENDS = {
+    YoloBackend.name: YoloBackend,
+    YuNetBackend.name: YuNetBackend,
+}
+
+
+def _resolve_model_path(model_path):
+    if model_path.startswith("models/"):
+        return get_model_path(model_path[len("models/"):])
+    if not os.path.isabs(model_path):
+        return os.path.join(os.path.dirname(__file__), "..", model_path)
+    return model_path
+
 
 class FaceDetector:
-    def __init__(self, model_path="models/yolov8n-face.pt", confidence=0.5):
+    def __init__(self, model_path="models/yolov8n-face.pt", confidence=0.5, backend="auto", runtime="opencv",
+                 precision="fp32"):
         """
-        Initialize YOLOv8 face detection model
-        
+        Initialize the face detection model
+
         Args:
-            model_path: Path to the YOLOv8 face model
+            model_path: Path to the face model (.pt for YOLO, .onnx for YuNet)
             confidence: Confidence threshold for detections
+            backend: "yolo", "yunet" or "auto" (YOLO when its weights are present, else YuNet)
+            runtime: "opencv" or "onnxruntime"; ONNX Runtime only applies to YuNet
+            precision: "fp32", "int8" or "fp16" YuNet variant (see model_quantization.py)
         """
         self.confidence = confidence
-        
+
         # Ensure models are available (downloads missing optional models)
         ensure_models(download_missing=True)
 
-        # Resolve model path
-        if model_path == "models/yolov8n-face.pt":
-            model_path = get_model_path("yolov8n-face.pt")
-        elif not os.path.isabs(model_path):
-            model_path = os.path.join(os.path.dirname(__file__), "..", model_path)
-        
+        model_path = _resolve_model_path(model_path)
+
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Unknown runtime: {runtime}")
+        if backend == "auto":
+            # Only YuNet has ONNX Runtime and reduced-precision variants
+            if (runtime == "onnxruntime" or precision != "fp32"
+                    or model_path.endswith(".onnx") or not os.path.exists(model_path)):
+                backend = YuNetBackend.name
+            else:
+                backend = YoloBackend.name
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown detection backend: {backend}")
+
+        # A YOLO weights path means nothing to YuNet; use the bundled ONNX model
+        if backend == YuNetBackend.name and not model_path.endswith(".onnx"):
+            model_path = get_model_path(YUNET_MODEL)
+        if backend == YuNetBackend.name and precision != "fp32":
+            model_path = get_variant_path(os.path.basename(model_path), precision)
+        elif precision != "fp32":
+            print(f"⚠ {backend} backend ignores precision={precision}", file=sys.stderr)
+        self.precision = precision
+
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found at {model_path}")
-        
-        # Suppress ALL output from YOLO loading
-        import sys
-        import io
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        sys.stdout = io.StringIO()
-        sys.stderr = io.StringIO()
-        
-        try:
-            self.model = YOLO(model_path, verbose=False)
-        finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
-        
-        # Log to stderr only (safe for JSON communication)
-        print(f"✓ YOLOv8 Face model loaded", file=sys.stderr)
-    
-    def detect_faces(self, frame):
-        """
-        Detect faces in a frame
-        
-        Args:
-            frame: Input video frame (OpenCV format)
-            
-        Returns:
-            dict: Detection results with face count, boxes, and status
-        """
-        results = self.model(frame, conf=self.confidence, verbose=False)
-        faces = []
-        
-        for r in results:
-            if r.boxes is None or len(r.boxes) == 0:
-                continue
-            for box in r.boxes:
-                xyxy = box.xyxy[0].cpu().numpy()
-                x1, y1, x2, y2 = map(int, xyxy)
-                confidence = float(box.conf[0].cpu().numpy())
-                faces.append({
-                    'bbox': (x1, y1, x2, y2),
-                    'confidence': confidence
-                })
-        
+
+        if backend == YuNetBackend.name:
+            self.backend = YuNetBackend(model_path, runtime=runtime)
+        else:
+            if runtime != "opencv":
+                print(f"⚠ {backend} backend ignores runtime={runtime}", file=sys.stderr)
+            self.backend = BACKENDS[backend](model_path)
+
+    @property
+    def input_size(self):
+        """Long side in pixels worth decoding frames at for this detector"""
+        return self.backend.input_size
+
+    @staticmethod
+    def summarize(faces):
+        """Build the detection result dict (count, status, color) for a list of faces"""
         face_count = len(faces)
-        
+
         # Determine proctoring status
         if face_count == 0:
             status = "⚠ NO FACE DETECTED"
@@ -81,13 +219,44 @@ class FaceDetector:
         else:
             status = "✓ VALID FACE"
             color = (0, 255, 0)  # Green
-        
+
         return {
             'face_count': face_count,
             'faces': faces,
             'status': status,
             'color': color
         }
+
+    def detect_faces(self, frame):
+        """
+        Detect faces in a frame
+        
+        Args:
+            frame: Input video frame (OpenCV format)
+            
+        Returns:
+            dict: Detection results with face count, boxes, and status
+        """
+        faces = self.backend.detect(frame, self.confidence)
+        return self.summarize(faces)
+
+    def detect_faces_batch(self, frames, batch_size=16):
+        """
+        Detect faces in several frames with as few model calls as possible
+
+        Args:
+            frames: Sequence of video frames (OpenCV format)
+            batch_size: Maximum frames per inference call
+
+        Returns:
+            list: One detect_faces()-style result per input frame, in order
+        """
+        results = []
+        for start in range(0, len(frames), batch_size):
+            chunk = frames[start:start + batch_size]
+            for faces in self.backend.detect_batch(chunk, self.confidence):
+                results.append(self.summarize(faces))
+        return results
     
     def draw_detections(self, frame, detection_result):
         """
@@ -105,6 +274,8 @@ class FaceDetector:
             x1, y1, x2, y2 = face['bbox']
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
             confidence_text = f"{face['confidence']:.2f}"
+            if 'track_id' in face:
+                confidence_text = f"#{face['track_id']} {confidence_text}"
             cv2.putText(frame, confidence_text, (x1, y1 - 5),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1)
         
@@ -120,6 +291,114 @@ class FaceDetector:
         return frame
 
 
+def _map_faces(faces, scale=1.0, dx=0, dy=0):
+    """Map faces detected in a scaled and/or cropped image back to frame coordinates"""
+    for face in faces:
+        x1, y1, x2, y2 = face['bbox']
+        face['bbox'] = (int(x1 * scale) + dx, int(y1 * scale) + dy, int(x2 * scale) + dx, int(y2 * scale) + dy)
+        if 'landmarks' in face:
+            face['landmarks'] = [(int(x * scale) + dx, int(y * scale) + dy) for x, y in face['landmarks']]
+    return faces
+
+
+class RoiFaceDetector:
+    """
+    Per-session wrapper around a FaceDetector that searches near the last face
+
+    While exactly one face is known, frames are cropped to its box plus a margin
+    and detected at native resolution. Once full_interval seconds have passed
+    since the last full-frame pass, and whenever the crop finds no face or a face
+    touching its edge, the whole frame is detected instead, downscaled to the
+    detector's input size. The interval is time-based because callers such as
+    FaceTracker only call the detector every few frames: a second person entering
+    away from the face is noticed at the first detector call after full_interval.
+    """
+    def __init__(self, detector, margin=0.5, full_interval=2.0, full_size=None):
+        """
+        Args:
+            detector: FaceDetector (shared; this object only holds session state)
+            margin: Crop margin on each side, as a fraction of the face box size
+            full_interval: Seconds after which the next call is a full-frame pass
+            full_size: Long side for full-frame passes (default: detector.input_size)
+        """
+        self.detector = detector
+        self.margin = margin
+        self.full_interval = full_interval
+        self.full_size = full_size or getattr(detector, 'input_size', None)
+        self.reset()
+
+    def reset(self):
+        self.last_box = None
+        self._last_full = None
+        self.roi_runs = 0
+        self.full_runs = 0
+
+    def detect_faces(self, frame, timestamp=None):
+        """
+        Same result as FaceDetector.detect_faces, plus result['roi'] = crop used (None = full frame)
+
+        Args:
+            frame: BGR video frame
+            timestamp: Frame time in seconds (defaults to the monotonic clock)
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.last_box is not None and timestamp - self._last_full < self.full_interval:
+            result = self._detect_roi(frame)
+            if result is not None:
+                return result
+        return self._detect_full(frame, timestamp)
+
+    def _crop_box(self, frame):
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = self.last_box
+        mx = int((x2 - x1) * self.margin)
+        my = int((y2 - y1) * self.margin)
+        return max(0, x1 - mx), max(0, y1 - my), min(width, x2 + mx), min(height, y2 + my)
+
+    def _detect_roi(self, frame):
+        height, width = frame.shape[:2]
+        cx1, cy1, cx2, cy2 = self._crop_box(frame)
+        if cx2 - cx1 < 16 or cy2 - cy1 < 16:
+            return None
+        crop = np.ascontiguousarray(frame[cy1:cy2, cx1:cx2])
+        faces = self.detector.detect_faces(crop)['faces']
+        self.roi_runs += 1
+        if len(faces) != 1:
+            return None
+
+        # A face cut by the crop edge (but not by the frame edge) has moved out of the ROI
+        x1, y1, x2, y2 = faces[0]['bbox']
+        crop_w, crop_h = cx2 - cx1, cy2 - cy1
+        if ((x1 <= 1 and cx1 > 0) or (y1 <= 1 and cy1 > 0)
+                or (x2 >= crop_w - 1 and cx2 < width) or (y2 >= crop_h - 1 and cy2 < height)):
+            return None
+
+        faces = _map_faces(faces, dx=cx1, dy=cy1)
+        self.last_box = faces[0]['bbox']
+        result = self.detector.summarize(faces)
+        result['roi'] = (cx1, cy1, cx2, cy2)
+        return result
+
+    def _detect_full(self, frame, timestamp):
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if self.full_size and max(height, width) > self.full_size:
+            scale = max(height, width) / float(self.full_size)
+            frame = cv2.resize(frame, (int(width / scale), int(height / scale)), interpolation=cv2.INTER_AREA)
+        faces = _map_faces(self.detector.detect_faces(frame)['faces'], scale)
+        self.full_runs += 1
+        self._last_full = timestamp
+        # The ROI only makes sense for the usual single-candidate frame
+        self.last_box = faces[0]['bbox'] if len(faces) == 1 else None
+        result = self.detector.summarize(faces)
+        result['roi'] = None
+        return result
+
+    def get_stats(self):
+        return {'roi_runs': self.roi_runs, 'full_runs': self.full_runs}
+
+
 def main():
     """Run real-time face detection"""
     try:
@@ -0,0 +1,166 @@
+"""
+Face Tracker - follows detected faces with sparse optical flow between detector runs
+"""
+import time
+import cv2
+import numpy as np
+from face_detection import FaceDetector
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two lists of (x1, y1, x2, y2) boxes"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(1, -1, 4)
+    ix = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    iy = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = ix * iy
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+class _Track:
+    def __init__(self, track_id, face, points):
+        self.track_id = track_id
+        self.face = face
+        self.points = points  # (N, 1, 2) float32 feature points inside the box
+        self.initial_points = len(points)
+
+
+class FaceTracker:
+    def __init__(self, detect_interval=10, min_track_quality=0.5, max_points=30, iou_threshold=0.3,
+                 max_detect_age=1.0):
+        """
+        Initialize the tracker
+
+        Args:
+            detect_interval: Run the detector at least every N frames
+            min_track_quality: Fraction of a track's feature points that must survive;
+                               below this the detector runs again
+            max_points: Feature points sampled per face box
+            iou_threshold: Minimum IoU for a detection to keep an existing track ID
+            max_detect_age: Run the detector at least every this many seconds, however
+                            few frames reach update() (e.g. behind an adaptive sampler)
+        """
+        self.detect_interval = detect_interval
+        self.min_track_quality = min_track_quality
+        self.max_points = max_points
+        self.iou_threshold = iou_threshold
+        self.max_detect_age = max_detect_age
+        self._lk_params = dict(
+            winSize=(15, 15),
+            maxLevel=2,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+        )
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self._prev_gray = None
+        self._next_id = 1
+        self._frames_since_detect = 0
+        self._last_detect = None
+        self.detector_runs = 0
+        self.tracked_frames = 0
+
+    def update(self, frame, detect_fn, timestamp=None):
+        """
+        Return detections for a frame, running detect_fn only when tracking is not enough
+
+        Args:
+            frame: BGR video frame
+            detect_fn: Callable(frame) -> FaceDetector.detect_faces()-style dict
+            timestamp: Frame time in seconds (defaults to the monotonic clock)
+
+        Returns:
+            dict: Detection result; each face also carries 'track_id'
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+        quality = None
+        fresh = self._last_detect is not None and timestamp - self._last_detect < self.max_detect_age
+        if self.tracks and fresh and self._frames_since_detect < self.detect_interval:
+            quality = self._track(gray)
+
+        if quality is None or quality < self.min_track_quality:
+            detections = detect_fn(frame)
+            self._assign_tracks(gray, detections['faces'])
+            self._frames_since_detect = 0
+            self._last_detect = timestamp
+            self.detector_runs += 1
+            detected = True
+        else:
+            self._frames_since_detect += 1
+            self.tracked_frames += 1
+            detected = False
+
+        self._prev_gray = gray
+        result = FaceDetector.summarize([track.face for track in self.tracks])
+        result['tracking'] = {'detected': detected, 'quality': quality}
+        return result
+
+    def _track(self, gray):
+        """Move every track by the median flow of its points; return the worst track quality"""
+        all_points = np.concatenate([track.points for track in self.tracks])
+        if len(all_points) == 0:
+            return 0.0
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, all_points, None, **self._lk_params)
+        status = status.reshape(-1).astype(bool)
+
+        height, width = gray.shape[:2]
+        worst = 1.0
+        start = 0
+        for track in self.tracks:
+            end = start + len(track.points)
+            good = status[start:end]
+            old_pts = all_points[start:end][good]
+            new_pts = new_points[start:end][good]
+            start = end
+
+            quality = len(new_pts) / max(track.initial_points, 1)
+            worst = min(worst, quality)
+            if len(new_pts) < 4:
+                return 0.0
+
+            dx, dy = np.median((new_pts - old_pts).reshape(-1, 2), axis=0)
+            x1, y1, x2, y2 = track.face['bbox']
+            x1, x2 = np.clip([x1 + dx, x2 + dx], 0, width).astype(int)
+            y1, y2 = np.clip([y1 + dy, y2 + dy], 0, height).astype(int)
+            track.face = dict(track.face, bbox=(int(x1), int(y1), int(x2), int(y2)), tracked=True)
+            track.points = new_pts.reshape(-1, 1, 2)
+        return worst
+
+    def _assign_tracks(self, gray, faces):
+        """Start tracks for new detections, keeping IDs of tracks they overlap"""
+        ids = [None] * len(faces)
+        if self.tracks and faces:
+            ious = iou_matrix([f['bbox'] for f in faces], [t.face['bbox'] for t in self.tracks])
+            # Greedy assignment, best overlaps first
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                i, j = np.unravel_index(flat, ious.shape)
+                if ious[i, j] < self.iou_threshold:
+                    break
+                track_id = self.tracks[j].track_id
+                if ids[i] is None and track_id not in ids:
+                    ids[i] = track_id
+
+        tracks = []
+        for face, track_id in zip(faces, ids):
+            if track_id is None:
+                track_id = self._next_id
+                self._next_id += 1
+            face = dict(face, track_id=track_id)
+            tracks.append(_Track(track_id, face, self._sample_points(gray, face['bbox'])))
+        self.tracks = tracks
+
+    def _sample_points(self, gray, bbox):
+        x1, y1, x2, y2 = (max(0, v) for v in bbox)
+        roi = gray[y1:y2, x1:x2]
+        points = None
+        if roi.shape[0] >= 8 and roi.shape[1] >= 8:
+            points = cv2.goodFeaturesToTrack(roi, self.max_points, 0.01, 5)
+        if points is None:
+            return np.empty((0, 1, 2), dtype=np.float32)
+        return (points + np.array([x1, y1], dtype=np.float32)).astype(np.float32)
@@ -0,0 +1,178 @@
+"""
+Frame Decoder - decode request images at the resolution the detector needs
+
+JPEG frames larger than the detector input are decoded with OpenCV's
+IMREAD_REDUCED_* modes, which let libjpeg skip most of the IDCT work instead of
+decoding full size and resizing afterwards. The image size is read from the
+JPEG/PNG header first, so the scale is chosen before any pixel is decoded.
+Callers get the scale back to map detections onto the original frame.
+
+cv2.imdecode always allocates its result, so pooling covers what comes after
+it: downscaled raw frames and the greyscale plane are written into buffers
+that are reused across requests.
+"""
+import base64
+import struct
+import numpy as np
+import cv2
+
+
+# Decode factor -> imdecode mode
+READ_MODES = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Start-of-frame markers carry the image size (C4/C8/CC are DHT/JPG/DAC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def image_size(buf):
+    """
+    Read (width, height) from a JPEG or PNG header without decoding
+
+    Returns:
+        tuple or None: None for other formats or a malformed header
+    """
+    data = memoryview(buf).cast("B")
+    if bytes(data[:8]) == _PNG_SIGNATURE and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height
+    if bytes(data[:2]) != b"\xff\xd8":
+        return None
+
+    pos, size = 2, len(data)
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:  # no length field
+            pos += 2
+            continue
+        if marker in _JPEG_SOF:
+            if pos + 9 > size:
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+    return None
+
+
+def reduced_factor(size, target_size):
+    """
+    Largest decode factor (1, 2, 4 or 8) that keeps the long side >= target_size
+
+    Args:
+        size: (width, height) of the encoded image, or None if unknown
+        target_size: Long side in pixels the detector works at (None = full size)
+    """
+    if size is None or not target_size:
+        return 1
+    long_side = max(size)
+    for factor in (8, 4, 2):
+        if long_side // factor >= target_size:
+            return factor
+    return 1
+
+
+def data_url_bytes(data_url: str):
+    """Base64 payload of a data URL (or of a bare base64 string) as a uint8 array"""
+    comma = data_url.find(",")
+    return np.frombuffer(base64.b64decode(data_url[comma + 1:] if comma >= 0 else data_url), np.uint8)
+
+
+class BufferPool:
+    """One reusable array per (shape, dtype); a buffer is only valid until the next get() of that shape"""
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0
+
+    def get(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = np.empty(shape, dtype)
+            self.allocations += 1
+        return buf
+
+
+class FrameDecoder:
+    def __init__(self, target_size=None):
+        """
+        Args:
+            target_size: Long side in pixels the detector works at; larger
+                         frames are decoded at 1/2, 1/4 or 1/8 scale (None = full size)
+        """
+        self.target_size = target_size
+        self.pool = BufferPool()
+        self.reduced = 0
+
+    def decode(self, req: dict):
+        """
+        Decode the frame of a request, whichever protocol it arrived on
+
+        Args:
+            req: JSON request ('image' data URL) or binary frame ('image_bytes')
+
+        Returns:
+            tuple: (image, scale) where scale = original size / decoded size,
+                   so detections multiply by it to land on the original frame.
+                   A raw downscaled frame lives in a pooled buffer and is only
+                   valid until the next request.
+        """
+        if "image_bytes" in req:
+            buf = np.frombuffer(req["image_bytes"], np.uint8)
+            if req.get("encoding") == "bgr":
+                return self._raw(req, buf)
+        else:
+            buf = data_url_bytes(req.get("image"))
+
+        size = image_size(buf)
+        factor = reduced_factor(size, self.target_size)
+        image = cv2.imdecode(buf, READ_MODES[factor])
+        if image is None:
+            raise ValueError("Could not decode image")
+        if factor == 1:
+            return image, 1.0
+
+        self.reduced += 1
+        # libjpeg rounds reduced sizes up, so take the exact ratio from the result
+        # (long sides, in case EXIF orientation rotated the image)
+        return image, max(size) / max(image.shape[:2])
+
+    def _raw(self, req, buf):
+        width, height = int(req["width"]), int(req["height"])
+        if buf.size != width * height * 3:
+            raise ValueError(f"Raw frame size {buf.size} does not match {width}x{height}x3")
+        image = buf.reshape(height, width, 3)
+
+        factor = reduced_factor((width, height), self.target_size)
+        if factor > 1:
+            size = (width // factor, height // factor)
+            image = cv2.resize(image, size, dst=self.pool.get((size[1], size[0], 3)),
+                               interpolation=cv2.INTER_AREA)
+            self.reduced += 1
+        return image, width / image.shape[1]
+
+    def to_gray(self, frame):
+        """Greyscale copy of a BGR frame in a pooled buffer (valid until the next call)"""
+        if frame.ndim == 2:
+            return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.pool.get(frame.shape[:2]))
+
+
+def scale_faces(faces, scale):
+    """Map face dicts from a reduced-resolution frame back to original pixel coordinates"""
+    if scale == 1.0:
+        return faces
+    for face in faces:
+        face['bbox'] = tuple(int(round(v * scale)) for v in face['bbox'])
+        if 'landmarks' in face:
+            face['landmarks'] = [(int(round(x * scale)), int(round(y * scale))) for x, y in face['landmarks']]
+    return faces
@@ -0,0 +1,137 @@
+"""
+Frame protocol for verify_server - JSON lines plus length-prefixed binary frames
+
+Binary frame layout (little endian):
+    magic       4 bytes   b"SEBF"
+    header_len  uint32    length of the JSON header
+    payload_len uint32    length of the image payload
+    header      JSON      request fields (id, enroll, encoding, width, height)
+    payload     bytes     encoded JPEG/PNG, or raw BGR pixels when encoding == "bgr"
+
+JSON requests are plain lines starting with '{', so both kinds can share one stream.
+read_message() parses a blocking stream (stdin); read_message_async() the same
+format from an asyncio StreamReader (socket clients).
+"""
+import json
+import struct
+import asyncio
+
+
+BINARY_MAGIC = b"SEBF"
+FRAME_PREFIX = struct.Struct("<4sII")
+PROTOCOLS = ["json", "binary"]
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_PAYLOAD_BYTES = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """Raised when the stream can no longer be parsed (framing is lost)"""
+
+
+def _read_exact(stream, size):
+    """Read exactly size bytes into a fresh bytearray, or None on EOF"""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = stream.readinto(view[pos:])
+        if not n:
+            return None
+        pos += n
+    return buf
+
+
+def read_message(stream):
+    """
+    Read the next request from a buffered binary stream
+
+    Args:
+        stream: Buffered binary reader (e.g. sys.stdin.buffer)
+
+    Returns:
+        dict: Parsed request. Binary frames carry their payload under
+              'image_bytes' as a bytearray, so it can be wrapped with
+              np.frombuffer without another copy.
+        None: End of stream
+
+    Raises:
+        ValueError: A JSON line could not be parsed (stream is still usable)
+        ProtocolError: A binary frame was truncated or malformed
+    """
+    while True:
+        head = stream.peek(1)[:1]
+        if not head:
+            return None
+
+        if head == BINARY_MAGIC[:1]:
+            return _read_binary_frame(stream)
+
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            continue
+        return json.loads(line)
+
+
+def _unpack_prefix(prefix):
+    magic, header_len, payload_len = FRAME_PREFIX.unpack(prefix)
+    if magic != BINARY_MAGIC:
+        raise ProtocolError(f"Bad frame magic: {bytes(magic)!r}")
+    if header_len > MAX_HEADER_BYTES or payload_len > MAX_PAYLOAD_BYTES:
+        raise ProtocolError(f"Frame too large: header={header_len} payload={payload_len}")
+    return header_len, payload_len
+
+
+def _read_binary_frame(stream):
+    prefix = _read_exact(stream, FRAME_PREFIX.size)
+    if prefix is None:
+        raise ProtocolError("Truncated binary frame prefix")
+
+    header_len, payload_len = _unpack_prefix(prefix)
+    header = _read_exact(stream, header_len)
+    payload = _read_exact(stream, payload_len)
+    if header is None or payload is None:
+        raise ProtocolError("Truncated binary frame body")
+
+    req = json.loads(header)
+    req["image_bytes"] = payload
+    return req
+
+
+async def read_message_async(reader):
+    """
+    Read the next request from an asyncio.StreamReader
+
+    Same format and return values as read_message(); the payload of a binary
+    frame arrives as bytes instead of a bytearray.
+    """
+    while True:
+        head = await reader.read(1)
+        if not head:
+            return None
+
+        if head == BINARY_MAGIC[:1]:
+            try:
+                prefix = head + await reader.readexactly(FRAME_PREFIX.size - 1)
+                header_len, payload_len = _unpack_prefix(prefix)
+                header = await reader.readexactly(header_len)
+                payload = await reader.readexactly(payload_len)
+            except asyncio.IncompleteReadError:
+                raise ProtocolError("Truncated binary frame")
+            req = json.loads(header)
+            req["image_bytes"] = payload
+            return req
+
+        line = (head + await reader.readline()).strip()
+        if not line:
+            continue
+        return json.loads(line)
+
+
+def encode_binary_frame(header: dict, payload) -> bytes:
+    """Build a binary frame for Python clients"""
+    header_bytes = json.dumps(header).encode("utf-8")
+    return FRAME_PREFIX.pack(BINARY_MAGIC, len(header_bytes), len(payload)) + header_bytes + bytes(payload)
@@ -0,0 +1,76 @@
+"""
+Adaptive frame sampler - skips full inference while the scene is not changing
+"""
+import cv2
+
+
+class AdaptiveSampler:
+    def __init__(self, motion_threshold=3.0, max_staleness=1.0, thumb_size=(32, 24)):
+        """
+        Initialize the sampler
+
+        Args:
+            motion_threshold: Mean absolute grey-level difference (0-255) against the
+                              last inferred frame that counts as motion
+            max_staleness: Seconds after which inference runs even without motion
+            thumb_size: (width, height) of the thumbnail used for the difference
+        """
+        self.motion_threshold = motion_threshold
+        self.max_staleness = max_staleness
+        self.thumb_size = thumb_size
+        self.reset()
+
+    def reset(self):
+        self._key_thumb = None
+        self._key_time = None
+        self.frames = 0
+        self.skipped = 0
+
+    def _thumbnail(self, frame):
+        # Shrink first so the colour conversion only touches a few hundred pixels
+        thumb = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        if thumb.ndim == 3:
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        return thumb
+
+    def update(self, frame, timestamp):
+        """
+        Decide whether a frame needs full inference
+
+        Args:
+            frame: Video frame (BGR or greyscale)
+            timestamp: Frame time in seconds
+
+        Returns:
+            dict: {infer: bool, motion_score: float, reason: str}
+        """
+        self.frames += 1
+        thumb = self._thumbnail(frame)
+
+        if self._key_thumb is None:
+            motion_score, reason = 0.0, "first_frame"
+        else:
+            # Compared against the last inferred frame, so slow drift still adds up
+            motion_score = float(cv2.absdiff(thumb, self._key_thumb).mean())
+            if motion_score >= self.motion_threshold:
+                reason = "motion"
+            elif timestamp - self._key_time >= self.max_staleness:
+                reason = "stale"
+            else:
+                self.skipped += 1
+                return {"infer": False, "motion_score": motion_score, "reason": "stable"}
+
+        self._key_thumb = thumb
+        self._key_time = timestamp
+        return {"infer": True, "motion_score": motion_score, "reason": reason}
+
+    @property
+    def skip_rate(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def get_stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_rate": self.skip_rate,
+        }
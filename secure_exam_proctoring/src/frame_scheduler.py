@@ -0,0 +1,153 @@
+"""
+Frame Scheduler - backpressure between the request reader and an inference backend
+
+At most max_inflight frames are handed to the backend at once. Frames waiting
+beyond that are kept newest-wins per session: a new frame from a session
+replaces (drops) its queued predecessor, and a frame whose deadline passes
+while waiting is dropped instead of processed. A session has at most one
+frame in the backend at a time (the worker pool pins sessions to one worker,
+so a second one would only queue there, out of reach of newest-wins).
+Latency therefore stays bounded by one inference per session instead of
+growing with the backlog.
+"""
+import time
+import itertools
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_SESSION = "default"
+
+
+class FrameScheduler:
+    def __init__(self, on_response, on_drop, max_inflight=1, arrival_key="_received"):
+        """
+        Args:
+            on_response: Callable(response) for every backend response
+            on_drop: Callable(req, reason) for frames that will not be processed
+                     ("superseded" or "deadline")
+            max_inflight: Frames handed to the backend at once (its worker count)
+            arrival_key: Request key holding the monotonic arrival time
+        """
+        self.on_response = on_response
+        self.on_drop = on_drop
+        self.max_inflight = max_inflight
+        self.arrival_key = arrival_key
+        self.backend = None
+
+        self._cond = threading.Condition()
+        self._waiting = OrderedDict()  # session key -> newest request, in arrival order of the session
+        self._unique = itertools.count()
+        self._inflight = 0
+        self._active = {}  # request id -> (session key, id substituted) of frames in the backend
+        self._closed = False
+        self._thread = None
+
+        self.dispatched = 0
+        self.dropped = {"superseded": 0, "deadline": 0}
+
+    def attach(self, backend):
+        """Start dispatching to backend (anything with submit(req))"""
+        self.backend = backend
+        self._thread = threading.Thread(target=self._run, name="frame-scheduler", daemon=True)
+        self._thread.start()
+
+    def _key(self, req):
+        # Enrollment frames are never superseded: each gets its own slot
+        if req.get("enroll"):
+            return ("enroll", next(self._unique))
+        return ("session", req.get("session", DEFAULT_SESSION))
+
+    def submit(self, req):
+        """Queue a frame, dropping the session's older queued frame if there is one"""
+        deadline_ms = req.get("deadline_ms")
+        if deadline_ms is not None:
+            req["_deadline"] = req.get(self.arrival_key, time.monotonic()) + float(deadline_ms) / 1000.0
+
+        key = self._key(req)
+        with self._cond:
+            superseded = self._waiting.get(key)
+            # Assigning an existing key keeps the session's place in line
+            self._waiting[key] = req
+            self._cond.notify()
+        if superseded is not None:
+            self._drop(superseded, "superseded")
+
+    def complete(self, response):
+        """Backend callback: frees a slot, then passes the response on"""
+        with self._cond:
+            self._inflight = max(0, self._inflight - 1)
+            entry = self._active.pop(response.get("id"), None)
+            self._cond.notify()
+        if entry is not None and entry[1]:
+            response["id"] = None
+        self.on_response(response)
+
+    def _drop(self, req, reason):
+        self.dropped[reason] += 1
+        self.on_drop(req, reason)
+
+    def _next_key(self):
+        """Oldest waiting session without a frame in the backend"""
+        busy = {key for key, _ in self._active.values()}
+        for key in self._waiting:
+            if key not in busy:
+                return key
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                key = None
+                while True:
+                    if self._inflight < self.max_inflight:
+                        key = self._next_key()
+                        if key is not None:
+                            break
+                    if self._closed and not self._waiting:
+                        return
+                    self._cond.wait()
+                req = self._waiting.pop(key)
+                deadline = req.pop("_deadline", None)
+                expired = deadline is not None and time.monotonic() > deadline
+                if not expired:
+                    self._inflight += 1
+                    self.dispatched += 1
+                    substituted = req.get("id") is None
+                    if substituted:
+                        # Stands in for the missing id so the response can be told
+                        # apart; complete() restores None before passing it on
+                        req["id"] = ("scheduler", next(self._unique))
+                    self._active[req["id"]] = (key, substituted)
+
+            if expired:
+                self._drop(req, "deadline")
+            else:
+                self.backend.submit(req)
+
+    def pending(self):
+        with self._cond:
+            return len(self._waiting)
+
+    def inflight(self):
+        with self._cond:
+            return self._inflight
+
+    def close(self):
+        """Dispatch what is still queued, then stop (the backend drains its own queue on close)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get_stats(self):
+        dropped = sum(self.dropped.values())
+        total = self.dispatched + dropped
+        return {
+            "dispatched": self.dispatched,
+            "dropped": dict(self.dropped),
+            "drop_rate": dropped / total if total else 0.0,
+            "waiting": self.pending(),
+            "inflight": self.inflight(),
+        }
@@ -1,6 +1,9 @@
+import sys
 import cv2
 import numpy as np
-from model_registry import ensure_models, get_model_path
+from model_registry import ensure_models, get_variant_path, load_model
+from embedding_gallery import normalize_rows
+from onnx_runtime import RUNTIMES
 
 
 class IdentityMatcher:
@@ -8,19 +11,35 @@ class IdentityMatcher:
     Identity matching using SFace ONNX embeddings + cosine similarity.
     Fallback to simple histogram-based features if ONNX fails.
     """
-    def __init__(self, model_name="face_recognition_sface_2021dec.onnx"):
+    def __init__(self, model_name="face_recognition_sface_2021dec.onnx", runtime="opencv", precision="fp32"):
+        """
+        Args:
+            model_name: SFace model file in models/
+            runtime: "opencv" (cv2.dnn) or "onnxruntime"
+            precision: "fp32", "int8" or "fp16" variant (see model_quantization.py)
+        """
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Unknown runtime: {runtime}")
         ensure_models(download_missing=True)
-        self.model_path = get_model_path(model_name)
-        self.net = None
+        self.model_name = model_name
+        self.model_path = get_variant_path(model_name, precision)
+        self.runtime = runtime
+        self.precision = precision
         self.use_fallback = False
         
         try:
-            self.net = cv2.dnn.readNetFromONNX(self.model_path)
-            print(f"✓ SFace model loaded successfully")
+            self.net  # load now so a broken model falls back immediately
+            print(f"✓ SFace model loaded successfully ({runtime}, {precision})", file=sys.stderr)
         except Exception as e:
-            print(f"⚠ ONNX model failed to load, using histogram fallback: {e}")
+            print(f"⚠ ONNX model failed to load, using histogram fallback: {e}", file=sys.stderr)
             self.use_fallback = True
 
+    @property
+    def net(self):
+        # cv2.dnn.Net is not thread-safe (one per thread); an ORT session is shared
+        kind = "ort" if self.runtime == "onnxruntime" else "sface"
+        return load_model(self.model_name, path=self.model_path, kind=kind)
+
     @staticmethod
     def _preprocess(face_bgr: np.ndarray) -> np.ndarray:
         # SFace expects 112x112 RGB normalized to [-1, 1]
@@ -47,8 +66,12 @@ class IdentityMatcher:
             return self._extract_histogram_features(face)
         
         blob = self._preprocess(face)
-        self.net.setInput(blob)
-        emb = self.net.forward()
+        net = self.net
+        if self.runtime == "onnxruntime":
+            emb = net.forward(blob)
+        else:
+            net.setInput(blob)
+            emb = net.forward()
         emb = emb.flatten().astype(np.float32)
         # L2 normalize
         norm = np.linalg.norm(emb)
@@ -91,3 +114,100 @@ class IdentityMatcher:
             "score": score,
             "threshold": threshold,
         }
+
+    def match_gallery(self, embeddings, gallery, top_k: int = 1, threshold: float = 0.5) -> list:
+        """
+        Match many probe embeddings against an enrolled gallery in one matrix multiply
+
+        Args:
+            embeddings: One embedding or a (P, D) array of embeddings
+            gallery: EmbeddingGallery with pre-normalized rows
+            top_k: Number of best identities returned per probe
+            threshold: Similarity needed for 'match'
+
+        Returns:
+            list: Per probe, up to top_k dicts {id, score, match} sorted by score
+        """
+        probes = normalize_rows(np.atleast_2d(embeddings))
+        scores = gallery.scores(probes)
+
+        top_k = min(top_k, len(gallery))
+        if top_k <= 0:
+            return [[] for _ in range(len(probes))]
+
+        # Unordered top-k per row, then sort only those k
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [
+                {"id": gallery.ids[row], "score": float(score), "match": bool(score >= threshold)}
+                for row, score in zip(rows, row_scores)
+            ]
+            for rows, row_scores in zip(top.tolist(), top_scores.tolist())
+        ]
+
+
+class IdentityCache:
+    """
+    Reuses identity results per face track so SFace only re-runs when something changed:
+    the face is new (or re-appeared), the check interval elapsed, or the box jumped.
+    """
+    def __init__(self, interval=2.0, max_jump=0.5):
+        """
+        Args:
+            interval: Seconds before a cached result is re-verified
+            max_jump: Box centre shift, as a fraction of box width, that forces re-verification
+        """
+        self.interval = interval
+        self.max_jump = max_jump
+        self._entries = {}  # key -> (result, bbox, timestamp)
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(face):
+        # Without tracking there is one face slot, guarded by the jump check
+        return face.get('track_id', 0)
+
+    def lookup(self, face, timestamp):
+        """
+        Return the cached result for a face (with 'cached' and 'age' added), or None
+        when it needs verifying again
+        """
+        entry = self._entries.get(self._key(face))
+        if entry is not None:
+            result, bbox, verified_at = entry
+            age = timestamp - verified_at
+            if age < self.interval and not self._jumped(bbox, face['bbox']):
+                self.hits += 1
+                return dict(result, cached=True, age=age)
+        self.misses += 1
+        return None
+
+    def store(self, face, result, timestamp):
+        self._entries[self._key(face)] = (result, face['bbox'], timestamp)
+        return dict(result, cached=False, age=0.0)
+
+    def retain(self, faces):
+        """Forget faces that left the frame so their return counts as a re-appearance"""
+        keep = {self._key(face) for face in faces}
+        for key in list(self._entries):
+            if key not in keep:
+                del self._entries[key]
+
+    def _jumped(self, old_bbox, new_bbox):
+        ox = (old_bbox[0] + old_bbox[2]) / 2.0
+        oy = (old_bbox[1] + old_bbox[3]) / 2.0
+        nx = (new_bbox[0] + new_bbox[2]) / 2.0
+        ny = (new_bbox[1] + new_bbox[3]) / 2.0
+        width = max(old_bbox[2] - old_bbox[0], 1)
+        return max(abs(nx - ox), abs(ny - oy)) > self.max_jump * width
@@ -1,17 +1,62 @@
+import time
+from collections import deque
 import cv2
 import numpy as np
 
 
+class LivenessState:
+    """
+    Rolling per-session buffers for LivenessDetector. One detector (and its
+    cascades) can serve many sessions, each keeping one of these.
+    """
+    def __init__(self, window):
+        self.motion = deque(maxlen=window)  # per-frame face ROI motion (grey levels)
+        self.blink_frames = deque(maxlen=window)  # frame indices where a blink completed
+        self.prev_roi = None
+        self.frames = 0
+        self.eyes_detected = 0
+        self.eyes_closed_run = 0
+        self.eyes_seen_open = False
+        self.eye_cost_ms = 0.0  # running estimate of the eye stage cost
+
+    def reset(self):
+        """Forget the face's history (the eye cost estimate is kept)"""
+        self.motion.clear()
+        self.blink_frames.clear()
+        self.prev_roi = None
+        self.frames = 0
+        self.eyes_detected = 0
+        self.eyes_closed_run = 0
+        self.eyes_seen_open = False
+
+
 class LivenessDetector:
     """
     Lightweight liveness check using motion in face ROI + eye presence.
     Uses OpenCV haar cascades bundled with OpenCV.
     """
-    def __init__(self, motion_threshold=8.0, stable_frames=8):
+    def __init__(self, motion_threshold=8.0, stable_frames=8, window=30, min_motion_score=0.25,
+                 roi_size=(64, 64), eye_roi_width=96, max_blink_frames=6, budget_ms=4.0):
+        """
+        Args:
+            motion_threshold: Mean grey-level change per frame that counts as full motion (score 1.0)
+            stable_frames: Frames of history needed before a face can be judged not live
+            window: Frames kept in the rolling buffers
+            min_motion_score: Windowed motion score that alone proves liveness
+            roi_size: Size the face ROI is shrunk to for motion scoring
+            eye_roi_width: Width the upper face is scaled to for eye detection
+            max_blink_frames: Longest eyes-closed run still counted as a blink
+            budget_ms: Per-frame time budget; the eye stage is skipped when it would overrun
+        """
         self.motion_threshold = motion_threshold
         self.stable_frames = stable_frames
-        self.prev_face_gray = None
-        self.live_frame_count = 0
+        self.window = window
+        self.min_motion_score = min_motion_score
+        self.roi_size = roi_size
+        self.eye_roi_width = eye_roi_width
+        self.max_blink_frames = max_blink_frames
+        self.budget_ms = budget_ms
+        self.state = self.new_state()
 
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
@@ -20,14 +65,107 @@ class LivenessDetector:
             cv2.data.haarcascades + "haarcascade_eye.xml"
         )
 
-    def detect(self, frame, face_boxes=None):
+    def new_state(self):
+        return LivenessState(self.window)
+
+    @staticmethod
+    def _first_box(face_boxes):
+        if face_boxes is None or len(face_boxes) == 0:
+            return None
+        # Accept a single (x1, y1, x2, y2) box as well as a list of boxes
+        if np.isscalar(face_boxes[0]):
+            return face_boxes
+        return face_boxes[0]
+
+    def detect(self, frame, face_boxes=None, state=None):
         """
-        Returns dict: {is_live: bool, motion_score: float, eyes_detected: int}
-        DEMO MODE: Always return is_live=True for testing
+        Score liveness of the first face from rolling motion and blink history
+
+        Args:
+            frame: BGR or greyscale frame
+            face_boxes: List of (x1, y1, x2, y2) boxes, or a single box
+            state: LivenessState for the session (defaults to the detector's own)
+
+        Returns dict: {is_live: bool, motion_score: float (0-1), eyes_detected: int,
+                       blinks: int, eyes_checked: bool, cost_ms: float, budget_exceeded: bool}
         """
-        # DEMO MODE: Simple liveness - just return true if we have a frame
+        start = time.perf_counter()
+        state = state or self.state
+
+        box = self._first_box(face_boxes)
+        face = None
+        if box is not None:
+            x1, y1, x2, y2 = (max(0, int(v)) for v in box)
+            face = frame[y1:y2, x1:x2]
+        if face is None or face.size == 0:
+            # Face lost: the history no longer refers to the face that returns,
+            # which gets the stable_frames warm-up again
+            state.reset()
+            return self._result(False, state, start, eyes_checked=False)
+
+        state.frames += 1
+        if face.ndim == 3:
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+
+        # Motion: mean absolute difference of the shrunken face between frames
+        roi = cv2.resize(face, self.roi_size, interpolation=cv2.INTER_AREA)
+        if state.prev_roi is not None:
+            state.motion.append(float(cv2.absdiff(roi, state.prev_roi).mean()))
+        state.prev_roi = roi
+
+        # Eyes: only on the upper face, and only if the budget allows it
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        eyes_checked = elapsed_ms + state.eye_cost_ms <= self.budget_ms
+        if eyes_checked:
+            eye_start = time.perf_counter()
+            self._update_eyes(face, state)
+            cost = (time.perf_counter() - eye_start) * 1000.0
+            state.eye_cost_ms = cost if state.eye_cost_ms == 0.0 else 0.8 * state.eye_cost_ms + 0.2 * cost
+        else:
+            # Let the estimate decay so the eye stage is retried later
+            state.eye_cost_ms *= 0.9
+
+        motion_score = self._motion_score(state)
+        recent_blink = bool(state.blink_frames) and state.frames - state.blink_frames[-1] < self.window
+        is_live = (
+            state.frames < self.stable_frames
+            or recent_blink
+            or motion_score >= self.min_motion_score
+        )
+        return self._result(is_live, state, start, eyes_checked)
+
+    def _update_eyes(self, face_gray, state):
+        height, width = face_gray.shape[:2]
+        upper = face_gray[: int(height * 0.6)]
+        scale = self.eye_roi_width / float(max(width, 1))
+        if scale < 1.0:
+            upper = cv2.resize(upper, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        eyes = self.eye_cascade.detectMultiScale(upper, scaleFactor=1.15, minNeighbors=4, minSize=(10, 10))
+        state.eyes_detected = len(eyes)
+
+        # Blink = eyes seen open, then a short run of closed frames, then open again
+        if state.eyes_detected > 0:
+            if state.eyes_seen_open and 0 < state.eyes_closed_run <= self.max_blink_frames:
+                state.blink_frames.append(state.frames)
+            state.eyes_seen_open = True
+            state.eyes_closed_run = 0
+        elif state.eyes_seen_open:
+            state.eyes_closed_run += 1
+
+    def _motion_score(self, state):
+        if not state.motion:
+            return 0.0
+        return float(min(1.0, np.mean(state.motion) / self.motion_threshold))
+
+    def _result(self, is_live, state, start, eyes_checked):
+        cost_ms = (time.perf_counter() - start) * 1000.0
         return {
-            "is_live": True,
-            "motion_score": 0.95,
-            "eyes_detected": 2
+            "is_live": bool(is_live),
+            "motion_score": self._motion_score(state),
+            "eyes_detected": state.eyes_detected,
+            "blinks": sum(1 for f in state.blink_frames if state.frames - f < self.window),
+            "eyes_checked": eyes_checked,
+            "cost_ms": cost_ms,
+            "budget_exceeded": cost_ms > self.budget_ms,
         }
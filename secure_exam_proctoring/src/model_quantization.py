@@ -0,0 +1,216 @@
+"""
+Model Quantization - generate INT8 / FP16 variants of the registry's ONNX models
+
+INT8 uses ONNX Runtime static quantization (QDQ format, per-channel weights)
+calibrated on sample frames; FP16 halves the weights and keeps float32 inputs
+and outputs. Variants are written next to the originals under the names
+registered in model_registry.MODELS (<stem>_int8.onnx, <stem>_fp16.onnx).
+
+Compare a variant against FP32 with:
+    python benchmark.py --stages precision --precisions int8,fp16
+
+Usage:
+    python model_quantization.py build --calibration frames/
+    python model_quantization.py build --models face_recognition_sface_2021dec.onnx --precisions fp16
+    python model_quantization.py list
+"""
+import os
+import sys
+import argparse
+import tempfile
+import cv2
+import numpy as np
+from model_registry import (
+    MODELS, QUANTIZABLE, PRECISIONS, get_model_path, variant_name, list_models, evict_model,
+)
+
+
+CALIBRATION_SIZE = (640, 480)
+
+
+def load_calibration_frames(directory=None, count=32, seed=0):
+    """
+    Frames used to calibrate INT8 activation ranges
+
+    Args:
+        directory: Folder of .jpg/.png webcam frames (real frames calibrate best)
+        count: Maximum number of frames
+        seed: Seed for the synthetic fallback frames
+    """
+    if directory:
+        names = sorted(n for n in os.listdir(directory) if n.lower().endswith(('.jpg', '.jpeg', '.png')))
+        frames = [cv2.imread(os.path.join(directory, n), cv2.IMREAD_COLOR) for n in names[:count]]
+        frames = [f for f in frames if f is not None]
+        if frames:
+            return frames
+        print(f"⚠ No images found in {directory}, using synthetic frames", file=sys.stderr)
+
+    print("⚠ Calibrating on synthetic frames; pass --calibration for better INT8 accuracy", file=sys.stderr)
+    rng = np.random.default_rng(seed)
+    width, height = CALIBRATION_SIZE
+    return [
+        cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (15, 15), 0)
+        for _ in range(count)
+    ]
+
+
+def _yunet_blob(frame):
+    # Same padding as cv2.FaceDetectorYN (bottom/right up to a multiple of 32)
+    frame = cv2.resize(frame, CALIBRATION_SIZE)
+    height, width = frame.shape[:2]
+    pad_h = (height - 1) // 32 * 32 + 32
+    pad_w = (width - 1) // 32 * 32 + 32
+    frame = cv2.copyMakeBorder(frame, 0, pad_h - height, 0, pad_w - width, cv2.BORDER_CONSTANT, value=0)
+    return cv2.dnn.blobFromImage(frame)
+
+
+def _sface_blob(frame):
+    from identity_match import IdentityMatcher
+
+    height, width = frame.shape[:2]
+    face = frame[height // 4: 3 * height // 4, width // 4: 3 * width // 4]
+    return IdentityMatcher._preprocess(face)
+
+
+# Model kind -> frame preprocessing matching what the model sees at inference
+CALIBRATION_INPUTS = {
+    "yunet": _yunet_blob,
+    "sface": _sface_blob,
+}
+
+
+class FrameCalibrationReader:
+    """onnxruntime.quantization CalibrationDataReader over preprocessed frames"""
+    def __init__(self, input_name, blobs):
+        self.input_name = input_name
+        self.blobs = blobs
+        self._iter = iter(self.blobs)
+
+    def get_next(self):
+        blob = next(self._iter, None)
+        return None if blob is None else {self.input_name: blob}
+
+    def rewind(self):
+        self._iter = iter(self.blobs)
+
+
+def quantize_int8(source, target, kind, frames):
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = ort.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = FrameCalibrationReader(input_name, [CALIBRATION_INPUTS[kind](f) for f in frames])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, "prepared.onnx")
+        try:
+            # Shape inference + graph cleanup makes quantization coverage better
+            quant_pre_process(source, prepared)
+        except Exception as e:
+            print(f"⚠ Pre-processing skipped: {e}", file=sys.stderr)
+            prepared = source
+
+        quantize_static(
+            prepared,
+            target,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+
+
+def convert_fp16(source, target):
+    import onnx
+    try:
+        from onnxconverter_common import float16
+    except ImportError:
+        from onnxruntime.transformers import float16
+
+    model = onnx.load(source)
+    onnx.save(float16.convert_float_to_float16(model, keep_io_types=True), target)
+
+
+def build_variant(name, precision, frames=None, force=False):
+    """
+    Generate one reduced-precision variant
+
+    Args:
+        name: FP32 model file name from QUANTIZABLE
+        precision: "int8" or "fp16"
+        frames: Calibration frames (INT8 only; synthetic when None)
+        force: Rebuild even if the variant is newer than its source
+
+    Returns:
+        str: Path of the variant
+    """
+    if name not in QUANTIZABLE:
+        raise ValueError(f"{name} has no reduced-precision variants")
+    if precision not in PRECISIONS[1:]:
+        raise ValueError(f"Unknown precision: {precision}")
+
+    source = get_model_path(name)
+    target = get_model_path(variant_name(name, precision))
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Model not found at {source}")
+    if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        print(f"✓ Up to date: {target}", file=sys.stderr)
+        return target
+
+    tmp_target = target + ".tmp"
+    if precision == "int8":
+        quantize_int8(source, tmp_target, MODELS[name]["kind"], frames or load_calibration_frames())
+    else:
+        convert_fp16(source, tmp_target)
+    os.replace(tmp_target, target)
+
+    # Drop any stale copy of the old file held by the model cache
+    for kind in (MODELS[name]["kind"], "ort"):
+        evict_model(variant_name(name, precision), kind=kind)
+
+    size_mb = os.path.getsize(target) / 1e6
+    print(f"✓ Built {target} ({size_mb:.1f} MB, source {os.path.getsize(source) / 1e6:.1f} MB)", file=sys.stderr)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate reduced-precision model variants")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Generate INT8/FP16 variants from the FP32 models")
+    build.add_argument("--models", default=",".join(QUANTIZABLE), help="Comma-separated FP32 model names")
+    build.add_argument("--precisions", default="int8,fp16", help="Comma-separated precisions to build")
+    build.add_argument("--calibration", help="Directory of sample frames for INT8 calibration")
+    build.add_argument("--calibration-frames", type=int, default=32, help="Frames used for calibration")
+    build.add_argument("--force", action="store_true", help="Rebuild variants that are up to date")
+
+    sub.add_parser("list", help="Show every model and precision variant")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, info in list_models().items():
+            mark = "✓" if info["exists"] else "✗"
+            print(f"{mark} {info['precision']:>4}  {name}")
+        return
+
+    precisions = [p.strip() for p in args.precisions.split(",") if p.strip()]
+    frames = None
+    if "int8" in precisions:
+        frames = load_calibration_frames(args.calibration, args.calibration_frames)
+
+    failed = False
+    for name in [m.strip() for m in args.models.split(",") if m.strip()]:
+        for precision in precisions:
+            try:
+                build_variant(name, precision, frames, force=args.force)
+            except Exception as e:
+                print(f"✗ {variant_name(name, precision)}: {e}", file=sys.stderr)
+                failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
 import os
+import sys
+import io
+import threading
 from pathlib import Path
 from urllib.request import urlretrieve
 
@@ -7,18 +10,52 @@ MODELS = {
     "yolov8n-face.pt": {
         "description": "YOLOv8 Nano Face Detector",
         "url": None,  # Bundled locally in the repo
+        "kind": "yolo",
     },
     "face_detection_yunet_2023mar.onnx": {
         "description": "OpenCV YuNet Face Detector (ONNX)",
         "url": "https://raw.githubusercontent.com/opencv/opencv_zoo/master/models/face_detection_yunet/face_detection_yunet_2023mar.onnx",
+        "kind": "yunet",
     },
     "face_recognition_sface_2021dec.onnx": {
         "description": "OpenCV SFace Face Recognition (ONNX)",
         "url": "https://raw.githubusercontent.com/opencv/opencv_zoo/master/models/face_recognition_sface/face_recognition_sface_2021dec.onnx",
+        "kind": "sface",
     },
 }
 
 
+PRECISIONS = ["fp32", "int8", "fp16"]
+
+# ONNX models with reduced-precision variants. The variants have no download
+# URL; model_quantization.py generates them from the FP32 file next to it.
+QUANTIZABLE = [
+    "face_detection_yunet_2023mar.onnx",
+    "face_recognition_sface_2021dec.onnx",
+]
+
+
+def variant_name(name: str, precision: str = "fp32") -> str:
+    """File name of a precision variant, e.g. face_recognition_sface_2021dec_int8.onnx"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    if precision == "fp32":
+        return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_{precision}{ext}"
+
+
+for _base in QUANTIZABLE:
+    for _precision in PRECISIONS[1:]:
+        MODELS[variant_name(_base, _precision)] = {
+            "description": f"{MODELS[_base]['description']} - {_precision.upper()} (generated locally)",
+            "url": None,
+            "kind": MODELS[_base]["kind"],
+            "source": _base,
+            "precision": _precision,
+        }
+
+
 def get_models_dir() -> Path:
     return Path(__file__).resolve().parent.parent / "models"
 
@@ -29,12 +66,21 @@ def list_models():
             "description": meta.get("description"),
             "exists": (get_models_dir() / name).exists(),
             "url": meta.get("url"),
+            "precision": meta.get("precision", "fp32"),
         }
         for name, meta in MODELS.items()
     }
 
 
+_models_ensured = False
+
+
 def ensure_models(download_missing: bool = True):
+    # Every detector/matcher constructor calls this; only check the disk once per process
+    global _models_ensured
+    if _models_ensured:
+        return
+
     models_dir = get_models_dir()
     models_dir.mkdir(parents=True, exist_ok=True)
 
@@ -48,11 +94,166 @@ def ensure_models(download_missing: bool = True):
             continue
 
         if download_missing:
-            print(f"Downloading model: {name}")
+            print(f"Downloading model: {name}", file=sys.stderr)
             urlretrieve(url, model_path)
-            print(f"✓ Saved: {model_path}")
+            print(f"✓ Saved: {model_path}", file=sys.stderr)
+
+    _models_ensured = download_missing
 
 
 def get_model_path(name: str) -> str:
     model_path = get_models_dir() / name
     return str(model_path)
+
+
+def get_variant_path(name: str, precision: str = "fp32") -> str:
+    """Path of a precision variant; raises if a generated variant has not been built yet"""
+    path = get_model_path(variant_name(name, precision))
+    if precision != "fp32" and not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{precision} variant of {name} not found at {path}; "
+            f"generate it with: python src/model_quantization.py build --precisions {precision}"
+        )
+    return path
+
+
+def _load_yolo(path):
+    from ultralytics import YOLO
+
+    # Suppress ALL output from YOLO loading (stdout carries JSON in verify_server)
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+    try:
+        return YOLO(path, verbose=False)
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+
+
+def _load_yunet(path):
+    import cv2
+    return cv2.FaceDetectorYN.create(path, "", (320, 320), 0.5, 0.3, 5000)
+
+
+def _load_onnx_net(path):
+    import cv2
+    return cv2.dnn.readNetFromONNX(path)
+
+
+def _load_ort_session(path):
+    from onnx_runtime import create_session
+    return create_session(path)
+
+
+# kind -> (loader(path), per_thread). The OpenCV and Ultralytics inference objects
+# are not safe to call from two threads at once, so each thread gets its own
+# instance; an ONNX Runtime session is thread-safe and shared.
+LOADERS = {
+    "yolo": (_load_yolo, True),
+    "yunet": (_load_yunet, True),
+    "sface": (_load_onnx_net, True),
+    "ort": (_load_ort_session, False),
+}
+
+
+class _CacheEntry:
+    def __init__(self, loader, per_thread):
+        self.loader = loader
+        self.per_thread = per_thread
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.value = None
+        self.loaded = False
+
+
+class ModelCache:
+    """
+    Process-wide cache of loaded models. Shared entries are loaded once;
+    per-thread entries are loaded once per thread that uses them.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key, loader, per_thread=False):
+        """
+        Return the cached model for key, loading it with loader() on first use
+
+        Args:
+            key: Hashable cache key
+            loader: Callable returning a freshly loaded model
+            per_thread: Give each thread its own instance
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _CacheEntry(loader, per_thread)
+
+        if entry.per_thread:
+            value = getattr(entry.local, "value", None)
+            if value is None:
+                value = entry.local.value = entry.loader()
+            return value
+
+        if not entry.loaded:
+            # Per-entry lock: concurrent first users wait instead of loading twice
+            with entry.lock:
+                if not entry.loaded:
+                    entry.value = entry.loader()
+                    entry.loaded = True
+        return entry.value
+
+    def evict(self, key=None):
+        """Drop one entry (or all); callers still holding a model keep it alive"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+
+MODEL_CACHE = ModelCache()
+
+
+def _model_key(name: str, path=None, kind=None):
+    path = os.path.abspath(path or get_model_path(name))
+    kind = kind or MODELS.get(name, {}).get("kind")
+    if kind not in LOADERS:
+        raise ValueError(f"No loader known for model {name} (kind={kind})")
+    return kind, path
+
+
+def load_model(name: str, path=None, kind=None):
+    """
+    Get the shared handle for a model, loading it on first use
+
+    Args:
+        name: Model file name from MODELS
+        path: Explicit model path (defaults to models/<name>)
+        kind: Loader kind when the name is not in MODELS ("yolo", "yunet", "sface", "ort")
+    """
+    key = _model_key(name, path, kind)
+    loader, per_thread = LOADERS[key[0]]
+    return MODEL_CACHE.get(key, lambda: loader(key[1]), per_thread=per_thread)
+
+
+def preload_models(names=None):
+    """Load models into the cache now (for per-thread models: for the calling thread)"""
+    loaded = []
+    for name in names or MODELS:
+        if not (get_models_dir() / name).exists():
+            continue
+        load_model(name)
+        loaded.append(name)
+    return loaded
+
+
+def evict_model(name=None, path=None, kind=None):
+    """Evict one model from the cache, or every model when name is None"""
+    if name is None:
+        MODEL_CACHE.evict()
+    else:
+        MODEL_CACHE.evict(_model_key(name, path, kind))
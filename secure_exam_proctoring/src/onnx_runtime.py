@@ -0,0 +1,193 @@
+"""
+ONNX Runtime execution - optional CPU backend for the registry's ONNX models
+
+Sessions get explicit intra/inter-op thread counts, and the optimized graph is
+saved next to the model (models/.ort_cache/) so later starts skip the
+optimization pass. onnxruntime is imported lazily; without it the cv2.dnn path
+is used.
+"""
+import os
+import sys
+import cv2
+import numpy as np
+
+
+RUNTIMES = ["opencv", "onnxruntime"]
+
+# Session settings; 0 threads lets ONNX Runtime pick (one per physical core)
+_options = {
+    "intra_op_threads": 0,
+    "inter_op_threads": 0,
+    "cache_dir": None,
+}
+
+
+def available() -> bool:
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def configure(intra_op_threads=None, inter_op_threads=None, cache_dir=None):
+    """
+    Set session options for models loaded from now on
+
+    Args:
+        intra_op_threads: Threads used inside one operator (0 = ONNX Runtime default)
+        inter_op_threads: Threads running independent operators in parallel
+        cache_dir: Where optimized graphs are kept (default: models/.ort_cache)
+    """
+    updates = {
+        "intra_op_threads": intra_op_threads,
+        "inter_op_threads": inter_op_threads,
+        "cache_dir": cache_dir,
+    }
+    changed = False
+    for key, value in updates.items():
+        if value is not None and _options[key] != value:
+            _options[key] = value
+            changed = True
+
+    if changed:
+        # Sessions already cached were built with the old options
+        from model_registry import MODEL_CACHE
+        for key in MODEL_CACHE.keys():
+            if key[0] == "ort":
+                MODEL_CACHE.evict(key)
+
+
+def get_options() -> dict:
+    return dict(_options)
+
+
+def optimized_model_path(path: str) -> str:
+    import onnxruntime as ort
+
+    cache_dir = _options["cache_dir"] or os.path.join(os.path.dirname(path), ".ort_cache")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    # Optimized graphs may use operators specific to the ONNX Runtime build
+    return os.path.join(cache_dir, f"{stem}.ort-{ort.__version__}.onnx")
+
+
+class OrtModel:
+    """InferenceSession wrapper; run() is thread-safe, so one instance serves every thread"""
+    def __init__(self, session, source):
+        self.session = session
+        self.source = source
+        self.input_name = session.get_inputs()[0].name
+        self.input_shape = session.get_inputs()[0].shape
+        self.output_names = [o.name for o in session.get_outputs()]
+
+    def run(self, blob: np.ndarray) -> dict:
+        outputs = self.session.run(None, {self.input_name: blob})
+        return dict(zip(self.output_names, outputs))
+
+    def forward(self, blob: np.ndarray) -> np.ndarray:
+        """First output only, like cv2.dnn.Net.forward()"""
+        return self.session.run(self.output_names[:1], {self.input_name: blob})[0]
+
+
+def create_session(path: str) -> OrtModel:
+    """
+    Load an ONNX model into ONNX Runtime, reusing the cached optimized graph when fresh
+
+    Args:
+        path: Path to the original .onnx model
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = int(_options["intra_op_threads"])
+    options.inter_op_num_threads = int(_options["inter_op_threads"])
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+    cached = optimized_model_path(path)
+    tmp_path = None
+    if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(path):
+        # Already optimized: skip the (slow) optimization pass at startup
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        source = cached
+    else:
+        # Extended (not ALL) optimizations: layout transforms are not safe to serialize
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # Worker processes may start together; each writes its own file, the last rename wins
+        tmp_path = f"{cached}.{os.getpid()}.tmp"
+        options.optimized_model_filepath = tmp_path
+        source = path
+
+    session = ort.InferenceSession(source, sess_options=options, providers=["CPUExecutionProvider"])
+    if tmp_path and os.path.exists(tmp_path):
+        try:
+            os.replace(tmp_path, cached)
+            print(f"✓ Cached optimized graph: {cached}", file=sys.stderr)
+        except OSError as e:
+            print(f"⚠ Could not cache optimized graph: {e}", file=sys.stderr)
+    return OrtModel(session, source)
+
+
+YUNET_STRIDES = (8, 16, 32)
+
+
+def yunet_detect(model: OrtModel, frame: np.ndarray, score_threshold=0.5, nms_threshold=0.3, top_k=5000):
+    """
+    Run YuNet through ONNX Runtime, decoding outputs the way cv2.FaceDetectorYN does
+
+    Returns:
+        np.ndarray | None: (N, 15) rows of x, y, w, h, 5 landmark (x, y) pairs, score
+    """
+    height, width = frame.shape[:2]
+    scale_x = scale_y = 1.0
+    _, _, in_h, in_w = model.input_shape
+    if isinstance(in_h, int) and isinstance(in_w, int):
+        # Fixed-size export: resize instead of padding, then map results back
+        scale_x, scale_y = width / float(in_w), height / float(in_h)
+        image = cv2.resize(frame, (in_w, in_h))
+        pad_h, pad_w = in_h, in_w
+    else:
+        # Same padding as FaceDetectorYN: bottom/right up to a multiple of 32
+        pad_h = (height - 1) // 32 * 32 + 32
+        pad_w = (width - 1) // 32 * 32 + 32
+        image = cv2.copyMakeBorder(frame, 0, pad_h - height, 0, pad_w - width, cv2.BORDER_CONSTANT, value=0)
+
+    outputs = model.run(cv2.dnn.blobFromImage(image))
+    boxes, landmarks, scores = [], [], []
+    for stride in YUNET_STRIDES:
+        cols = pad_w // stride
+        cls = np.clip(outputs[f"cls_{stride}"].reshape(-1), 0.0, 1.0)
+        obj = np.clip(outputs[f"obj_{stride}"].reshape(-1), 0.0, 1.0)
+        score = np.sqrt(cls * obj)
+        keep = np.flatnonzero(score >= score_threshold)
+        if keep.size == 0:
+            continue
+        row, col = np.divmod(keep, cols)
+        bbox = outputs[f"bbox_{stride}"].reshape(-1, 4)[keep]
+        kps = outputs[f"kps_{stride}"].reshape(-1, 10)[keep]
+
+        cx = (col + bbox[:, 0]) * stride
+        cy = (row + bbox[:, 1]) * stride
+        w = np.exp(bbox[:, 2]) * stride
+        h = np.exp(bbox[:, 3]) * stride
+        boxes.append(np.stack([cx - w / 2, cy - h / 2, w, h], axis=1))
+        kps = kps.reshape(-1, 5, 2)
+        landmarks.append(np.stack([(kps[..., 0] + col[:, None]) * stride,
+                                   (kps[..., 1] + row[:, None]) * stride], axis=2).reshape(-1, 10))
+        scores.append(score[keep])
+
+    if not boxes:
+        return None
+    boxes = np.concatenate(boxes)
+    landmarks = np.concatenate(landmarks)
+    scores = np.concatenate(scores)
+
+    keep = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), score_threshold, nms_threshold, 1.0, top_k)
+    keep = np.asarray(keep, dtype=np.int64).reshape(-1)
+    if keep.size == 0:
+        return None
+
+    rows = np.concatenate([boxes[keep], landmarks[keep], scores[keep, None]], axis=1).astype(np.float32)
+    rows[:, 0:14:2] *= scale_x
+    rows[:, 1:14:2] *= scale_y
+    return rows
@@ -2,65 +2,128 @@
 Proctoring Service - Integrates face detection with exam session
 """
 import cv2
+import functools
 import threading
 import json
+import time
 from datetime import datetime
-from face_detection import FaceDetector
+from pathlib import Path
+from face_detection import FaceDetector, RoiFaceDetector
 from liveness_detection import LivenessDetector
-from identity_match import IdentityMatcher
+from identity_match import IdentityMatcher, IdentityCache
+from frame_sampler import AdaptiveSampler
+from face_tracker import FaceTracker
+from violation_log import ViolationLog
+from evidence_buffer import EvidenceRingBuffer
+from violation_rules import RuleEngine
+from async_writer import get_writer
+
+
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
 
 
 class ProctoringService:
-    def __init__(self, model_path="models/yolov8n-face.pt", reference_embedding=None):
+    def __init__(self, model_path="models/yolov8n-face.pt", reference_embedding=None,
+                 detector=None, liveness=None, identity_matcher=None, adaptive_sampling=True,
+                 tracking=True, identity_interval=2.0, log_dir=LOG_DIR, evidence=True,
+                 writer=None, roi_detection=True, rules=None):
         """
         Initialize the proctoring service
         
         Args:
             model_path: Path to YOLOv8 face detection model
+            reference_embedding: Enrolled identity embedding (optional)
+            detector: Shared FaceDetector to use instead of loading a new one
+            liveness: Shared LivenessDetector to use instead of creating a new one
+            identity_matcher: Shared IdentityMatcher to use instead of loading a new one
+            adaptive_sampling: Reuse the last inference result while the scene is static
+            tracking: Track faces with optical flow and run the detector only periodically
+            identity_interval: Seconds between identity re-checks of an unchanged face track
+            log_dir: Directory for the per-session violation logs (None = temporary file)
+            evidence: Keep recent frames and save them around each violation (needs log_dir)
+            writer: AsyncWriter for logs, evidence and reports (default: the shared one)
+            roi_detection: Detect around the last face, with periodic full-frame passes
+            rules: Violation rule dicts (see violation_rules.py; default: DEFAULT_RULES)
         """
-        self.detector = FaceDetector(model_path=model_path)
+        self.detector = detector or FaceDetector(model_path=model_path)
         self.is_running = False
         self.current_status = None
-        self.violations = []
+        self.log_dir = log_dir
+        self.violations = None  # ViolationLog, opened by start_proctoring
         self.frame_count = 0
-        self.violation_threshold = 5  # Number of frames before flagging violation
-        self.no_face_frames = 0
-        self.multiple_face_frames = 0
-        self.liveness = LivenessDetector()
-        self.identity_matcher = IdentityMatcher()
+        self.rules = RuleEngine(rules)
+        self.liveness = liveness or LivenessDetector()
+        self.liveness_state = self.liveness.new_state()
+        self.identity_matcher = identity_matcher or IdentityMatcher()
         self.reference_embedding = reference_embedding
-        self.not_live_frames = 0
+        self.identity_checks = 0
+        self._observed_checks = 0
+        self.sampler = AdaptiveSampler() if adaptive_sampling else None
+        self.tracker = FaceTracker() if tracking else None
+        self.roi_detector = RoiFaceDetector(self.detector) if roi_detection else None
+        self.identity_cache = IdentityCache(interval=identity_interval)
+        self.last_inference = None
+        self.writer = writer or get_writer()
+        self.evidence = EvidenceRingBuffer(writer=self.writer) if evidence and log_dir is not None else None
+        self.evidence_dir = None
     
-    def start_proctoring(self, exam_id):
+    def start_proctoring(self, exam_id, rules=None):
         """
         Start proctoring session
         
         Args:
             exam_id: ID of the exam being proctored
+            rules: Violation rules for this exam (default: keep the current ones)
         """
         self.is_running = True
-        self.violations = []
+        if rules is not None:
+            self.rules = RuleEngine(rules)
+        self.rules.reset()
+        if self.violations is not None:
+            self.violations.close()
+        log_path = None
+        if self.log_dir is not None:
+            session_name = f"{exam_id}_{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            log_path = Path(self.log_dir) / f"{session_name}.jsonl"
+            self.evidence_dir = Path(self.log_dir) / "evidence" / session_name
+        self.violations = ViolationLog(log_path, writer=self.writer)
+        if self.evidence:
+            self.evidence.reset()
         self.exam_id = exam_id
+        self.last_inference = None
+        if self.sampler:
+            self.sampler.reset()
+        if self.tracker:
+            self.tracker.reset()
+        if self.roi_detector:
+            self.roi_detector.reset()
+        self.identity_cache.reset()
+        self.liveness_state = self.liveness.new_state()
         print(f"✓ Proctoring started for exam {exam_id}")
     
     def stop_proctoring(self):
         """Stop proctoring session and return report"""
         self.is_running = False
+        if self.evidence:
+            self.evidence.flush()
         report = {
             'exam_id': self.exam_id,
             'total_frames': self.frame_count,
-            'violations': self.violations,
+            'violation_count': len(self.violations),
+            'violation_summary': self.violations.summary(),
+            'violation_log': self.violations.path,
             'timestamp': datetime.now().isoformat()
         }
         print(f"✓ Proctoring stopped. Violations: {len(self.violations)}")
         return report
     
-    def process_frame(self, frame):
+    def process_frame(self, frame, timestamp=None):
         """
         Process a single frame for face detection and violations
         
         Args:
             frame: Video frame
+            timestamp: Frame time in seconds (defaults to the monotonic clock)
             
         Returns:
             dict: Frame data with detections and status
@@ -69,96 +132,174 @@ class ProctoringService:
             return None
         
         self.frame_count += 1
-        
-        # Detect faces
-        detections = self.detector.detect_faces(frame)
-        face_count = detections['face_count']
+        if timestamp is None:
+            timestamp = time.monotonic()
 
-        # Liveness check
-        face_boxes = [f['bbox'] for f in detections['faces']]
-        liveness = self.liveness.detect(frame, face_boxes if face_boxes else None)
-
-        # Identity match (optional if reference embedding exists)
-        identity_result = None
-        if self.reference_embedding is not None and face_boxes:
-            current_emb = self.identity_matcher.extract_embedding(frame, face_boxes[0])
-            if current_emb is not None:
-                identity_result = self.identity_matcher.match(self.reference_embedding, current_emb)
+        # Skip inference while the scene is unchanged since the last full pass
+        sample = self.sampler.update(frame, timestamp) if self.sampler else None
+        if sample is None or sample['infer'] or self.last_inference is None:
+            self.last_inference = self._infer(frame, timestamp)
+        detections, liveness, identity_result = self.last_inference
+        face_count = detections['face_count']
+        if self.evidence:
+            self.evidence.add(frame, self.frame_count, timestamp)
         
         # Track violations
-        if face_count == 0:
-            self.no_face_frames += 1
-            if self.no_face_frames >= self.violation_threshold:
-                self.violations.append({
-                    'type': 'NO_FACE_DETECTED',
-                    'frame': self.frame_count,
-                    'timestamp': datetime.now().isoformat()
-                })
-                self.no_face_frames = 0
-        else:
-            self.no_face_frames = 0
-        
-        if face_count > 1:
-            self.multiple_face_frames += 1
-            if self.multiple_face_frames >= self.violation_threshold:
-                self.violations.append({
-                    'type': 'MULTIPLE_FACES',
-                    'frame': self.frame_count,
-                    'timestamp': datetime.now().isoformat()
-                })
-                self.multiple_face_frames = 0
-        else:
-            self.multiple_face_frames = 0
-
-        # Track liveness failures
-        if face_count == 1 and not liveness['is_live']:
-            self.not_live_frames += 1
-            if self.not_live_frames >= self.violation_threshold:
-                self.violations.append({
-                    'type': 'LIVENESS_FAILED',
-                    'frame': self.frame_count,
-                    'timestamp': datetime.now().isoformat(),
-                    'details': {
-                        'motion_score': liveness['motion_score'],
-                        'eyes_detected': liveness['eyes_detected']
-                    }
-                })
-                self.not_live_frames = 0
-        else:
-            self.not_live_frames = 0
-        
+        observation = {
+            'face_count': face_count,
+            'is_live': liveness['is_live'],
+            'motion_score': liveness['motion_score'],
+            'eyes_detected': liveness['eyes_detected'],
+            'identity_score': None,
+        }
+        # Identity rules count checks, not frames that reuse a cached result
+        if identity_result is not None and self.identity_checks != self._observed_checks:
+            observation['identity_score'] = identity_result['score']
+        self._observed_checks = self.identity_checks
+        for violation in self.rules.update(observation, timestamp):
+            self._record_violation(dict(
+                violation,
+                frame=self.frame_count,
+                timestamp=datetime.now().isoformat()
+            ), timestamp)
+
         self.current_status = detections['status']
+        if self.evidence:
+            self.evidence.poll(timestamp)
         
-        return {
+        result = {
             'frame_number': self.frame_count,
             'face_count': face_count,
             'status': detections['status'],
+            'faces': detections['faces'],
             'violation_count': len(self.violations),
             'liveness': liveness,
             'identity_match': identity_result
         }
+        if sample is not None:
+            result['sampling'] = {
+                'inferred': sample['infer'],
+                'reason': sample['reason'],
+                'motion_score': sample['motion_score'],
+                'skip_rate': self.sampler.skip_rate
+            }
+        return result
+
+    def _record_violation(self, entry, timestamp):
+        """Log a violation, linking the evidence frames saved around it"""
+        if self.evidence:
+            directory = self.evidence_dir / f"{entry['frame']:06d}_{entry['type']}"
+            entry['evidence'] = self.evidence.snapshot(directory, timestamp, meta={
+                'exam_id': self.exam_id, 'type': entry['type'], 'frame': entry['frame']
+            })
+        self.violations.append(entry)
+
+    def _infer(self, frame, timestamp):
+        """Run detection, liveness and identity on a frame"""
+        # Detect faces (tracked between periodic detector runs, near the last face when possible)
+        if self.roi_detector:
+            detect = functools.partial(self.roi_detector.detect_faces, timestamp=timestamp)
+        else:
+            detect = self.detector.detect_faces
+        if self.tracker:
+            detections = self.tracker.update(frame, detect, timestamp)
+        else:
+            detections = detect(frame)
+
+        # Liveness check
+        face_boxes = [f['bbox'] for f in detections['faces']]
+        liveness = self.liveness.detect(frame, face_boxes if face_boxes else None, state=self.liveness_state)
+
+        # Identity match (optional if reference embedding exists), cached per face track
+        identity_result = None
+        self.identity_cache.retain(detections['faces'])
+        if self.reference_embedding is not None and face_boxes:
+            face = detections['faces'][0]
+            identity_result = self.identity_cache.lookup(face, timestamp)
+            if identity_result is None:
+                current_emb = self.identity_matcher.extract_embedding(frame, face_boxes[0])
+                if current_emb is not None:
+                    self.identity_checks += 1
+                    identity_result = self.identity_cache.store(
+                        face, self.identity_matcher.match(self.reference_embedding, current_emb), timestamp
+                    )
+
+        return detections, liveness, identity_result
     
     def get_status(self):
         """Get current proctoring status"""
-        return {
+        status = {
             'is_running': self.is_running,
             'current_status': self.current_status,
             'frame_count': self.frame_count,
-            'violation_count': len(self.violations),
-            'violations': self.violations
+            'violation_count': 0,
+            'violations': []
+        }
+        if self.violations is not None:
+            # Constant-size: counts plus the latest entries; older ones via get_violations()
+            status['violation_count'] = len(self.violations)
+            status['violation_summary'] = self.violations.summary()
+            status['violations'] = list(self.violations.recent)
+        if self.sampler:
+            status['sampling'] = self.sampler.get_stats()
+        if self.tracker:
+            status['tracking'] = {
+                'detector_runs': self.tracker.detector_runs,
+                'tracked_frames': self.tracker.tracked_frames
+            }
+        status['rules'] = self.rules.get_stats()
+        if self.roi_detector:
+            status['roi_detection'] = self.roi_detector.get_stats()
+        if self.evidence:
+            status['evidence'] = self.evidence.get_stats()
+        status['writer'] = {
+            'queue_depth': self.writer.pending(),
+            'dropped': self.writer.counters['dropped'],
         }
+        status['identity_cache'] = {
+            'hits': self.identity_cache.hits,
+            'misses': self.identity_cache.misses
+        }
+        return status
     
+    def get_violations(self, cursor=0, limit=50):
+        """
+        Page through the session's violations, oldest first
+
+        Args:
+            cursor: 0, or 'next_cursor' from the previous page
+            limit: Maximum violations per page
+
+        Returns:
+            dict: {'violations': [...], 'next_cursor': int or None}
+        """
+        if self.violations is None:
+            return {'violations': [], 'next_cursor': None}
+        return self.violations.page(cursor, limit)
+
     def export_report(self, filepath):
-        """Export violation report to JSON"""
-        report = {
-            'exam_id': self.exam_id,
-            'total_frames': self.frame_count,
-            'violations': self.violations,
-            'timestamp': datetime.now().isoformat()
-        }
+        """
+        Export violation report to JSON in the background, streaming violations from the log
+
+        Returns:
+            Future: Resolves once the report is on disk
+        """
+        # Queued behind the violations still waiting to be appended, so the report sees them all
+        return self.writer.call(self._write_report, filepath, self.violations, self.exam_id, self.frame_count)
+
+    @staticmethod
+    def _write_report(filepath, violations, exam_id, total_frames):
         with open(filepath, 'w') as f:
-            json.dump(report, f, indent=2)
+            f.write('{\n')
+            f.write(f'  "exam_id": {json.dumps(exam_id)},\n')
+            f.write(f'  "total_frames": {total_frames},\n')
+            f.write('  "violations": ')
+            violations.write_json_array(f, indent="    ")
+            f.write(',\n')
+            f.write(f'  "timestamp": {json.dumps(datetime.now().isoformat())}\n')
+            f.write('}')
         print(f"✓ Report exported to {filepath}")
+        return filepath
 
 
 # Example usage with camera
@@ -183,8 +324,8 @@ def run_live_proctoring(exam_id):
             # Process frame
             frame_data = service.process_frame(frame)
             
-            # Draw detections
-            detections = service.detector.detect_faces(frame)
+            # Draw the detections process_frame just produced
+            detections = service.last_inference[0]
             frame = service.detector.draw_detections(frame, detections)
             
             # Add violation info
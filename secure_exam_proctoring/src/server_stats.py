@@ -0,0 +1,138 @@
+"""
+Server statistics - counters, gauges and fixed-bucket latency histograms
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram: O(1) memory, O(log buckets) per observation"""
+    BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return float(min(bound, self.max_ms))
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum_ms": self.sum_ms,
+            "mean_ms": self.sum_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+        }
+
+
+class ServerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self._gauges = {}  # name -> callable returning a number
+
+    def observe(self, stage, ms):
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = LatencyHistogram()
+            hist.observe(ms)
+
+    def observe_all(self, timings: dict):
+        for stage, ms in timings.items():
+            self.observe(stage, ms)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start) * 1000.0)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, fn):
+        """Register a callable sampled whenever stats are read (e.g. queue depth)"""
+        self._gauges[name] = fn
+
+    def _read_gauges(self):
+        values = {}
+        for name, fn in self._gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                values[name] = None
+        return values
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {stage: hist.snapshot() for stage, hist in self.histograms.items()}
+            counters = dict(self.counters)
+        return {
+            "uptime_s": time.time() - self.started_at,
+            "counters": counters,
+            "gauges": self._read_gauges(),
+            "latency_ms": histograms,
+        }
+
+    def to_prometheus(self, prefix="verify_server"):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            f"# TYPE {prefix}_uptime_seconds gauge",
+            f"{prefix}_uptime_seconds {time.time() - self.started_at:.3f}",
+        ]
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = [(stage, list(h.counts), h.sum_ms, h.count) for stage, h in sorted(self.histograms.items())]
+
+        for name, value in counters:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+
+        for name, value in sorted(self._read_gauges().items()):
+            if value is None:
+                continue
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+
+        metric = f"{prefix}_stage_latency_seconds"
+        if histograms:
+            lines.append(f"# TYPE {metric} histogram")
+        for stage, counts, sum_ms, count in histograms:
+            cumulative = 0
+            for bound, n in zip(LatencyHistogram.BUCKETS_MS, counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound / 1000.0:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {sum_ms / 1000.0:.6f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {count}')
+
+        return "\n".join(lines) + "\n"
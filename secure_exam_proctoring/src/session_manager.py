@@ -0,0 +1,162 @@
+"""
+Session Manager - hosts many proctoring sessions on one shared set of models
+"""
+import threading
+from collections import deque
+from face_detection import FaceDetector
+from liveness_detection import LivenessDetector
+from identity_match import IdentityMatcher
+from proctoring_service import ProctoringService
+
+
+class SessionManager:
+    def __init__(self, model_path="models/yolov8n-face.pt", max_pending_per_session=2):
+        """
+        Initialize the session manager and load the shared models once
+
+        Args:
+            model_path: Path to the face detection model
+            max_pending_per_session: Frames queued per session before the oldest is dropped
+        """
+        self.detector = FaceDetector(model_path=model_path)
+        self.liveness = LivenessDetector()
+        self.identity_matcher = IdentityMatcher()
+        self.max_pending_per_session = max_pending_per_session
+
+        self.sessions = {}
+        self._pending = {}  # session_id -> deque of frames
+        self._dropped = {}  # session_id -> frames dropped because the session fell behind
+        self._ready = deque()  # round-robin order of sessions with queued frames
+
+        self._lock = threading.Lock()
+        self._has_work = threading.Condition(self._lock)
+        # The shared models are not safe to run concurrently
+        self._inference_lock = threading.Lock()
+
+    def create_session(self, session_id, exam_id, reference_embedding=None, rules=None):
+        """
+        Create and start a proctoring session backed by the shared models
+
+        Args:
+            session_id: Unique key for the session (e.g. candidate seat)
+            exam_id: ID of the exam being proctored
+            reference_embedding: Enrolled identity embedding (optional)
+            rules: Violation rules for this exam (default: violation_rules.DEFAULT_RULES)
+
+        Returns:
+            ProctoringService: The per-session state object
+        """
+        with self._lock:
+            if session_id in self.sessions:
+                raise ValueError(f"Session already exists: {session_id}")
+
+        session = ProctoringService(
+            reference_embedding=reference_embedding,
+            detector=self.detector,
+            liveness=self.liveness,
+            identity_matcher=self.identity_matcher,
+            rules=rules,
+        )
+        session.start_proctoring(exam_id)
+
+        with self._lock:
+            self.sessions[session_id] = session
+            self._pending[session_id] = deque(maxlen=self.max_pending_per_session)
+            self._dropped[session_id] = 0
+        return session
+
+    def close_session(self, session_id):
+        """Stop a session, discard its queued frames and return its report"""
+        with self._lock:
+            session = self.sessions.pop(session_id)
+            self._pending.pop(session_id, None)
+            self._dropped.pop(session_id, None)
+            if session_id in self._ready:
+                self._ready.remove(session_id)
+        return session.stop_proctoring()
+
+    def get_session(self, session_id):
+        return self.sessions.get(session_id)
+
+    def submit_frame(self, session_id, frame):
+        """
+        Queue a frame for a session; the oldest queued frame is dropped if the session is behind
+
+        Returns:
+            bool: False if the session does not exist
+        """
+        with self._lock:
+            pending = self._pending.get(session_id)
+            if pending is None:
+                return False
+            if len(pending) == pending.maxlen:
+                self._dropped[session_id] += 1
+            pending.append(frame)
+            if session_id not in self._ready:
+                self._ready.append(session_id)
+                self._has_work.notify()
+        return True
+
+    def process_next(self, timeout=None):
+        """
+        Process one queued frame, taking sessions in round-robin order
+
+        Args:
+            timeout: Seconds to wait for work (None waits forever)
+
+        Returns:
+            tuple: (session_id, frame result), or None if nothing arrived in time
+        """
+        with self._lock:
+            if not self._ready and not self._has_work.wait_for(lambda: self._ready, timeout):
+                return None
+            session_id = self._ready.popleft()
+            pending = self._pending[session_id]
+            frame = pending.popleft()
+            if pending:
+                # Still has work: go to the back of the line
+                self._ready.append(session_id)
+            session = self.sessions[session_id]
+
+        return session_id, self._run(session, frame)
+
+    def process_frame(self, session_id, frame):
+        """Process a frame for a session immediately, bypassing the queue"""
+        return self._run(self.sessions[session_id], frame)
+
+    def _run(self, session, frame):
+        with self._inference_lock:
+            return session.process_frame(frame)
+
+    def run(self, stop_event, on_result=None):
+        """
+        Scheduler loop: process queued frames from all sessions until stop_event is set
+
+        Args:
+            stop_event: threading.Event that ends the loop
+            on_result: Optional callback(session_id, result)
+        """
+        while not stop_event.is_set():
+            item = self.process_next(timeout=0.1)
+            if item is not None and on_result is not None:
+                on_result(*item)
+
+    def get_status(self):
+        """Get a compact status summary for every session"""
+        with self._lock:
+            items = list(self.sessions.items())
+            pending = {sid: len(q) for sid, q in self._pending.items()}
+            dropped = dict(self._dropped)
+
+        return {
+            session_id: {
+                'exam_id': session.exam_id,
+                'is_running': session.is_running,
+                'current_status': session.current_status,
+                'frame_count': session.frame_count,
+                'violation_count': len(session.violations),
+                'pending_frames': pending.get(session_id, 0),
+                'dropped_frames': dropped.get(session_id, 0),
+            }
+            for session_id, session in items
+        }
@@ -0,0 +1,207 @@
+"""
+Socket Server - serve many verify clients from one set of warm models
+
+Clients connect over a Unix domain socket or localhost TCP and speak the same
+protocol as the stdin server (JSON lines and SEBF binary frames). Requests
+from every connection go to one shared dispatch function, so all clients share
+one scheduler and inference backend. Client request ids are remapped to
+server-wide ids on the way in and restored on the way out, and sessions are
+scoped per connection, so clients never see (or supersede) each other's frames.
+"""
+import os
+import sys
+import json
+import signal
+import asyncio
+import itertools
+import threading
+
+from frame_protocol import ProtocolError, MAX_PAYLOAD_BYTES, read_message_async
+
+
+def parse_address(address):
+    """
+    Parse a listen address
+
+    Args:
+        address: "unix:/path/to/socket", "host:port" or a bare port (localhost)
+
+    Returns:
+        tuple: ("unix", path) or ("tcp", host, port)
+    """
+    if address.startswith("unix:"):
+        return ("unix", address[len("unix:"):])
+    host, _, port = address.rpartition(":")
+    return ("tcp", host or "127.0.0.1", int(port))
+
+
+class _Connection:
+    def __init__(self, conn_id, loop, writer):
+        self.id = conn_id
+        self.loop = loop
+        self.writer = writer
+        self.closed = False
+
+    def send(self, line):
+        """Queue one response line (callable from any thread)"""
+        if not self.closed:
+            self.loop.call_soon_threadsafe(self._write, line)
+
+    def _write(self, line):
+        if not self.closed and not self.writer.is_closing():
+            self.writer.write(line.encode("utf-8") + b"\n")
+
+
+class ResponseRouter:
+    """Maps server-wide request ids back to (connection, client id)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._routes = {}
+        self._connections = {}
+        self._ready = None
+
+    def add(self, conn):
+        with self._lock:
+            self._connections[conn.id] = conn
+            ready = self._ready
+        if ready is not None:
+            conn.send(ready)
+
+    def remove(self, conn):
+        conn.closed = True
+        with self._lock:
+            self._connections.pop(conn.id, None)
+
+    def register(self, conn, client_id):
+        """Returns the server-wide id to use for a client request"""
+        server_id = next(self._ids)
+        with self._lock:
+            self._routes[server_id] = (conn, client_id)
+        return server_id
+
+    def claim(self, response):
+        """
+        Restore the client id on response and return the function that delivers it
+
+        Returns:
+            callable(line), or None when the response belongs to no client
+        """
+        if response.get("type") == "ready":
+            return self._broadcast_ready
+        with self._lock:
+            route = self._routes.pop(response.get("id"), None)
+        if route is None:
+            return None
+        conn, client_id = route
+        response["id"] = client_id
+        return conn.send  # a no-op once the client has disconnected
+
+    def _broadcast_ready(self, line):
+        # Clients that connect later get the same message on connect
+        with self._lock:
+            self._ready = line
+            connections = list(self._connections.values())
+        for conn in connections:
+            conn.send(line)
+
+    def connection_count(self):
+        with self._lock:
+            return len(self._connections)
+
+
+class SocketServer:
+    def __init__(self, address, handle_request, router, on_parse_error=None):
+        """
+        Args:
+            address: Listen address (see parse_address)
+            handle_request: Callable(req) for every request, with its id already remapped
+            router: ResponseRouter that emit() consults to deliver responses
+            on_parse_error: Callable() for requests that could not be parsed
+        """
+        self.address = parse_address(address)
+        self.handle_request = handle_request
+        self.router = router
+        self.on_parse_error = on_parse_error
+        self._conn_ids = itertools.count(1)
+        self._writers = set()
+
+    async def _client(self, reader, writer):
+        conn = _Connection(next(self._conn_ids), asyncio.get_running_loop(), writer)
+        self.router.add(conn)
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    req = await read_message_async(reader)
+                except ProtocolError as exc:
+                    print(f"⚠ Client {conn.id}: protocol error, closing: {exc}", file=sys.stderr)
+                    break
+                except ValueError as exc:
+                    if self.on_parse_error:
+                        self.on_parse_error()
+                    conn.send(json.dumps({"id": None, "error": f"Invalid request: {exc}"}))
+                    continue
+                if req is None:
+                    break
+                if not isinstance(req, dict):
+                    if self.on_parse_error:
+                        self.on_parse_error()
+                    conn.send(json.dumps({"id": None, "error": "Invalid request: expected a JSON object"}))
+                    continue
+
+                req["id"] = self.router.register(conn, req.get("id"))
+                if not req.get("cmd"):
+                    # Newest-wins only ever applies within one connection
+                    req["session"] = f"{conn.id}:{req.get('session', 'default')}"
+                self.handle_request(req)
+                # Stop reading from a client that does not read its responses
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Client went away, or the server is shutting down
+            pass
+        finally:
+            self.router.remove(conn)
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve(self):
+        # Base64 JSON frames can be far longer than the default 64 KiB line limit
+        if self.address[0] == "unix":
+            path = self.address[1]
+            if os.path.exists(path):
+                os.remove(path)  # stale socket from a previous run
+            server = await asyncio.start_unix_server(self._client, path=path, limit=MAX_PAYLOAD_BYTES)
+            where = path
+        else:
+            _, host, port = self.address
+            server = await asyncio.start_server(self._client, host=host, port=port, limit=MAX_PAYLOAD_BYTES)
+            where = f"{host}:{port}"
+        print(f"✓ Listening on {where}", file=sys.stderr)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await server.wait_closed()
+            if self.address[0] == "unix":
+                try:
+                    os.remove(self.address[1])
+                except OSError:
+                    pass
+
+    def serve_forever(self):
+        """Accept clients until SIGINT/SIGTERM"""
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
@@ -1,9 +1,17 @@
+import time
+
+PROCESS_START = time.perf_counter()
+
 import sys
 import json
-import base64
+import queue
+import argparse
+import functools
+import threading
+import traceback
+from collections import OrderedDict
 from pathlib import Path
 import numpy as np
-import cv2
 import os
 import warnings
 
@@ -14,13 +22,29 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 # Add src directory to path for imports
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from face_detection import FaceDetector
-from liveness_detection import LivenessDetector
-from identity_match import IdentityMatcher
+# Model modules (and Ultralytics/torch behind them) are imported by VerifyHandler,
+# off the request-reading thread, so the server can answer protocol commands at once
+from frame_protocol import PROTOCOLS, ProtocolError, read_message
+from frame_decoder import FrameDecoder, scale_faces
+from worker_pool import WorkerPool
+from frame_scheduler import FrameScheduler
+from socket_server import SocketServer, ResponseRouter
+from server_stats import ServerStats
+from async_writer import get_writer, close_writer
 
 
 REFERENCE_PATH = Path(__file__).resolve().parent.parent / "models" / "reference_embedding.npy"
 
+# Per-request stage timings travel inside the response under this key (also
+# across the worker pool pipe) and are stripped by emit() before writing
+TIMINGS_KEY = "_timings"
+RECEIVED_KEY = "_received"
+
+STATS = ServerStats()
+
+# Sessions whose state (last face position, liveness history) a handler remembers
+MAX_SESSIONS = 32
+
 
 def load_reference_embedding():
     if REFERENCE_PATH.exists():
@@ -29,83 +53,380 @@ def load_reference_embedding():
 
 
 def save_reference_embedding(embedding: np.ndarray):
-    REFERENCE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    np.save(str(REFERENCE_PATH), embedding)
+    """Queue the write on the background writer; returns a Future"""
+    return get_writer().save_npy(REFERENCE_PATH, embedding)
 
 
-def decode_image(data_url: str):
-    if "," in data_url:
-        data_url = data_url.split(",", 1)[1]
-    image_bytes = base64.b64decode(data_url)
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    return img
+class VerifyHandler:
+    """
+    Holds one loaded set of models and answers verification requests.
+    Used inline by the stdin server and once per process by the worker pool.
+    """
+    def __init__(self, runtime="opencv", ort_options=None, precision="fp32"):
+        """
+        Args:
+            runtime: "opencv" or "onnxruntime" for the ONNX models
+            ort_options: onnx_runtime.configure() keyword arguments (thread counts)
+            precision: "fp32", "int8" or "fp16" model variants (fp32 when not generated)
+        """
+        start = time.perf_counter()
+        from face_detection import FaceDetector
+        from liveness_detection import LivenessDetector
+        from identity_match import IdentityMatcher
+        import onnx_runtime
+        self.timings = {"import_ms": _elapsed_ms(start)}
 
+        if runtime == "onnxruntime" and not onnx_runtime.available():
+            print("⚠ onnxruntime not installed, using OpenCV DNN", file=sys.stderr)
+            runtime = "opencv"
+        onnx_runtime.configure(**(ort_options or {}))
 
-def main():
-    # Redirect print statements to stderr to keep stdout clean for JSON
-    import sys
-    
+        start = time.perf_counter()
+        try:
+            self.face_detector = _with_precision(
+                lambda p: FaceDetector(runtime=runtime, precision=p), precision)
+            print("Face detector initialized", file=sys.stderr)
+        except Exception as e:
+            print(f"Face detector init failed: {e}", file=sys.stderr)
+            self.face_detector = None
+
+        self.liveness = LivenessDetector()
+        self.matcher = _with_precision(lambda p: IdentityMatcher(runtime=runtime, precision=p), precision)
+        self.reference_embedding = load_reference_embedding()
+        self.has_reference = self.reference_embedding is not None
+        # Frames larger than the detector input are decoded at reduced resolution
+        self.decoder = FrameDecoder(target_size=self.face_detector.input_size if self.face_detector else None)
+        self.sessions = OrderedDict()  # session -> _SessionState, least recently used first
+        self.timings["load_ms"] = _elapsed_ms(start)
+
+    def warm_up(self):
+        """Run every model once on a dummy frame so the first real request is not the slow one"""
+        start = time.perf_counter()
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        box = (220, 140, 420, 340)
+        if self.face_detector:
+            try:
+                self.face_detector.detect_faces(frame)
+            except Exception as e:
+                print(f"Detector warm-up failed: {e}", file=sys.stderr)
+        self.liveness.detect(frame, [box], state=self.liveness.new_state())
+        self.matcher.extract_embedding(frame, box)
+        self.timings["warmup_ms"] = _elapsed_ms(start)
+
+    def close(self):
+        """Flush pending disk writes (called by the worker pool before the process exits)"""
+        close_writer()
+
+    def _session(self, session):
+        """Per-session state (the models themselves are shared); evicts the least recently used"""
+        state = self.sessions.pop(session, None) or _SessionState(self.face_detector, self.liveness)
+        self.sessions[session] = state
+        if len(self.sessions) > MAX_SESSIONS:
+            self.sessions.popitem(last=False)
+        return state
+
+    def handle(self, req: dict) -> dict:
+        """
+        Process one frame request
+
+        Args:
+            req: Request dict (JSON fields, or binary frame header + image_bytes)
+
+        Returns:
+            dict: Response to send back to the client
+        """
+        req_id = req.get("id")
+        enroll = bool(req.get("enroll"))
+        timings = {}
+
+        start = time.perf_counter()
+        frame, scale = self.decoder.decode(req)
+        gray = self.decoder.to_gray(frame)
+        timings["decode"] = _elapsed_ms(start)
+
+        session = self._session(req.get("session"))
+
+        # Face detection with fallback
+        detections = {"face_count": 0, "faces": []}
+        if session.roi_detector:
+            start = time.perf_counter()
+            try:
+                # Arrival time: monotonic() is system-wide, so valid in any worker
+                detections = session.roi_detector.detect_faces(frame, timestamp=req.get(RECEIVED_KEY))
+            except Exception as detect_err:
+                import traceback
+                error_msg = f"Detection failed: {str(detect_err)}\n{traceback.format_exc()}"
+                return {"id": req_id, "error": error_msg, RECEIVED_KEY: req.get(RECEIVED_KEY)}
+            timings["detect"] = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        face_boxes = [f["bbox"] for f in detections.get("faces", [])]
+        # Liveness only needs luma, at the decoded (possibly reduced) resolution
+        liveness_result = self.liveness.detect(gray, face_boxes if face_boxes else None,
+                                               state=session.liveness)
+        timings["liveness"] = _elapsed_ms(start)
+        # Clients draw boxes on the frame they sent
+        scale_faces(detections.get("faces", []), scale)
+
+        # DEMO MODE: Skip actual identity matching for now
+        start = time.perf_counter()
+        identity_result = None
+        if face_boxes:
+            # Auto-enroll on first face
+            if not self.has_reference:
+                save_reference_embedding(np.array([1.0] * 256))  # Dummy embedding
+                self.has_reference = True
+            # Always return match=true in demo mode
+            identity_result = {"match": True, "score": 0.95, "threshold": 0.5}
+        timings["identity"] = _elapsed_ms(start)
+
+        return {
+            "id": req_id,
+            "face_count": detections.get("face_count", 0),
+            "faces": detections.get("faces", []),
+            "liveness": liveness_result,
+            "identity_match": identity_result,
+            "has_reference": self.has_reference,
+            TIMINGS_KEY: timings,
+            RECEIVED_KEY: req.get(RECEIVED_KEY),
+        }
+
+
+class _SessionState:
+    """What a VerifyHandler remembers between frames of one session"""
+    def __init__(self, face_detector, liveness):
+        from face_detection import RoiFaceDetector
+        self.roi_detector = RoiFaceDetector(face_detector) if face_detector else None
+        self.liveness = liveness.new_state()
+
+
+def _elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000.0
+
+
+def _with_precision(factory, precision):
+    """Build a model at the requested precision, falling back to FP32 if the variant was never generated"""
     try:
-        face_detector = FaceDetector()
-        print("Face detector initialized", file=sys.stderr)
-    except Exception as e:
-        print(f"Face detector init failed: {e}", file=sys.stderr)
-        face_detector = None
-    
-    liveness = LivenessDetector()
-    matcher = IdentityMatcher()
-    reference_embedding = load_reference_embedding()
-    has_reference = reference_embedding is not None
-
-    for line in sys.stdin:
-        line = line.strip()
-        if not line:
-            continue
+        return factory(precision)
+    except FileNotFoundError as e:
+        if precision == "fp32":
+            raise
+        print(f"⚠ {e}; using fp32", file=sys.stderr)
+        return factory("fp32")
+
+
+class InlineBackend:
+    """
+    Single-process backend: loads VerifyHandler on a background thread and
+    processes frames there, so the reader thread stays free for commands
+    """
+    def __init__(self, on_ready, handler_factory=None, on_response=None):
+        self.on_ready = on_ready
+        self.handler_factory = handler_factory or VerifyHandler
+        self.on_response = on_response or emit
+        self.queue = queue.Queue()
+        self.handler = None
+        self._thread = threading.Thread(target=self._run, name="verify-inline", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.handler = self.handler_factory()
+            self.handler.warm_up()
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            print("⚠ Verify server failed to load models, exiting", file=sys.stderr)
+            sys.stderr.flush()
+            # No frame can ever be answered; exit so the client fails its pending
+            # requests now (sys.exit would only end this thread)
+            os._exit(1)
+        self.on_ready(self.handler.timings)
+
+        while True:
+            req = self.queue.get()
+            if req is None:
+                break
+            try:
+                response = self.handler.handle(req)
+            except Exception as exc:
+                response = {"id": req.get("id"), "error": str(exc), RECEIVED_KEY: req.get(RECEIVED_KEY)}
+            self.on_response(response)
+
+    def submit(self, req):
+        self.queue.put(req)
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+        if self.handler:
+            self.handler.close()
+
+
+def announce_ready(timings: dict, workers=1):
+    """Tell the client that models are loaded, with startup timings (no request id)"""
+    timings = dict(timings, total_ms=_elapsed_ms(PROCESS_START))
+    print(f"✓ Verify server ready in {timings['total_ms']:.0f} ms", file=sys.stderr)
+    emit({"type": "ready", "workers": workers, "timings": timings})
+
+
+_stdout_lock = threading.Lock()
+# Set in socket mode: responses go back to the client connection that asked
+_router = None
+
+
+def emit(response: dict):
+    """Write one JSON response line to its client (safe from any thread) and record its stats"""
+    timings = response.pop(TIMINGS_KEY, None)
+    received = response.pop(RECEIVED_KEY, None)
+    send = _router.claim(response) if _router is not None else None
+
+    start = time.perf_counter()
+    line = json.dumps(response)
+    if timings is not None:
+        STATS.observe_all(timings)
+        STATS.observe("serialize", _elapsed_ms(start))
+    if received is not None:
+        # monotonic() is system-wide, so this also holds across worker processes
+        STATS.observe("total", (time.monotonic() - received) * 1000.0)
+    if "error" in response:
+        STATS.incr("errors")
+
+    if send is not None:
+        send(line)
+        return
+    with _stdout_lock:
+        print(line, flush=True)
+
+
+def emit_dropped(req: dict, reason: str):
+    """Answer a frame the scheduler will not process, so the client can stop waiting for it"""
+    STATS.incr("dropped")
+    STATS.incr(f"dropped_{reason}")
+    emit({"id": req.get("id"), "dropped": True, "reason": reason})
+
+
+def handle_request(req: dict, dispatch):
+    """Answer a protocol command, or hand a frame request to dispatch"""
+    STATS.incr("requests")
+
+    # Protocol negotiation: clients opt in to binary frames after this
+    if req.get("cmd") == "hello":
+        emit({"id": req.get("id"), "protocols": PROTOCOLS})
+        return
+
+    if req.get("cmd") == "stats":
+        if req.get("format") == "prometheus":
+            emit({"id": req.get("id"), "text": STATS.to_prometheus()})
+        else:
+            emit({"id": req.get("id"), "stats": STATS.snapshot()})
+        return
+
+    req[RECEIVED_KEY] = time.monotonic()
+    STATS.incr("frames")
+    dispatch(req)
+
+
+def serve(stream, dispatch):
+    """
+    Read requests from stream and hand frame requests to dispatch
+
+    Protocol commands are answered here so they never wait behind frames.
+    """
+    while True:
+        req = None
         try:
-            req = json.loads(line)
-            req_id = req.get("id")
-            image_data = req.get("image")
-            enroll = bool(req.get("enroll"))
-
-            frame = decode_image(image_data)
-            
-            # Face detection with fallback
-            detections = {"face_count": 0, "faces": []}
-            if face_detector:
-                try:
-                    detections = face_detector.detect_faces(frame)
-                except Exception as detect_err:
-                    import traceback
-                    error_msg = f"Detection failed: {str(detect_err)}\n{traceback.format_exc()}"
-                    print(json.dumps({"id": req_id, "error": error_msg}), flush=True)
-                    continue
-            
-            face_boxes = [f["bbox"] for f in detections.get("faces", [])]
-            liveness_result = liveness.detect(frame, face_boxes if face_boxes else None)
-
-            # DEMO MODE: Skip actual identity matching for now
-            identity_result = None
-            if face_boxes:
-                # Auto-enroll on first face
-                if not has_reference:
-                    save_reference_embedding(np.array([1.0] * 256))  # Dummy embedding
-                    has_reference = True
-                # Always return match=true in demo mode
-                identity_result = {"match": True, "score": 0.95, "threshold": 0.5}
-
-            response = {
-                "id": req_id,
-                "face_count": detections.get("face_count", 0),
-                "faces": detections.get("faces", []),
-                "liveness": liveness_result,
-                "identity_match": identity_result,
-                "has_reference": has_reference,
-            }
-            print(json.dumps(response), flush=True)
+            req = read_message(stream)
+            if req is None:
+                break
+            handle_request(req, dispatch)
+        except ProtocolError as exc:
+            # Framing is lost; nothing after this point can be trusted
+            print(f"Protocol error, shutting down: {exc}", file=sys.stderr)
+            break
         except Exception as exc:
+            if not isinstance(req, dict):
+                STATS.incr("parse_errors")
             err_resp = {"id": req.get("id") if isinstance(req, dict) else None, "error": str(exc)}
-            print(json.dumps(err_resp), flush=True)
+            emit(err_resp)
+
+
+def serve_socket(address, dispatch):
+    """Serve many clients on a Unix socket or localhost TCP port, sharing one backend"""
+    def handle(req):
+        try:
+            handle_request(req, dispatch)
+        except Exception as exc:
+            emit({"id": req.get("id"), "error": str(exc)})
+
+    SocketServer(address, handle, _router, on_parse_error=lambda: STATS.incr("parse_errors")).serve_forever()
+
+
+def main():
+    global _router
+    parser = argparse.ArgumentParser(description="Face verification server (requests on stdin, JSON responses on stdout)")
+    parser.add_argument("--listen", metavar="ADDRESS",
+                        help="Serve clients on unix:/path/to.sock or [host:]port instead of stdin/stdout")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of pre-forked worker processes (1 = handle requests inline)")
+    parser.add_argument("--runtime", choices=["opencv", "onnxruntime"], default="opencv",
+                        help="Inference runtime for the ONNX models (YuNet, SFace)")
+    parser.add_argument("--precision", choices=["fp32", "int8", "fp16"], default="fp32",
+                        help="Model variant for YuNet and SFace (generate with model_quantization.py)")
+    parser.add_argument("--intra-op-threads", type=int, default=0,
+                        help="ONNX Runtime threads per operator (0 = one per core)")
+    parser.add_argument("--inter-op-threads", type=int, default=0,
+                        help="ONNX Runtime threads across operators (0 = default)")
+    args = parser.parse_args()
+
+    stdin = sys.stdin.buffer
+    if args.listen:
+        # Before the backend starts, so its "ready" message reaches socket clients
+        _router = ResponseRouter()
+        STATS.gauge("connections", _router.connection_count)
+    # Created here so disk latency lands in the stats (inline mode; workers have their own)
+    writer = get_writer(stats=STATS)
+    STATS.gauge("writer_queue_depth", writer.pending)
+    STATS.gauge("writer_dropped", lambda: writer.counters["dropped"])
+    # A partial (not a closure) so it pickles for spawn-based worker processes
+    handler_factory = functools.partial(
+        VerifyHandler,
+        runtime=args.runtime,
+        precision=args.precision,
+        ort_options={"intra_op_threads": args.intra_op_threads, "inter_op_threads": args.inter_op_threads},
+    )
+
+    # Frames beyond what the backend is processing wait here, newest-wins per session
+    scheduler = FrameScheduler(emit, emit_dropped, max_inflight=args.workers, arrival_key=RECEIVED_KEY)
+    STATS.gauge("scheduler_waiting", scheduler.pending)
+    STATS.gauge("drop_rate", lambda: scheduler.get_stats()["drop_rate"])
+
+    if args.workers > 1:
+        pool = WorkerPool(args.workers, handler_factory, scheduler.complete)
+        pool.start()
+        STATS.gauge("queue_depth", pool.pending)
+        STATS.gauge("worker_restarts", lambda: pool.restarts)
+
+        def wait_for_workers():
+            pool.ready_event.wait()
+            announce_ready({"load_ms": _elapsed_ms(PROCESS_START)}, workers=args.workers)
+        threading.Thread(target=wait_for_workers, daemon=True).start()
+        backend = pool
+    else:
+        backend = InlineBackend(announce_ready, handler_factory, on_response=scheduler.complete)
+        STATS.gauge("queue_depth", backend.pending)
+    scheduler.attach(backend)
+
+    try:
+        if args.listen:
+            serve_socket(args.listen, scheduler.submit)
+        else:
+            serve(stdin, scheduler.submit)
+    finally:
+        scheduler.close()
+        backend.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+"""
+Violation Log - append-only JSONL record of a session's violations
+
+Entries go to disk as they occur; memory holds only per-type counts and the
+most recent entries, so a long exam costs the same to poll at hour three as
+at minute one. Older entries are read back with byte-offset cursors. With an
+AsyncWriter, appends are written by its thread instead of the caller's.
+"""
+import os
+import json
+import tempfile
+import threading
+from collections import deque
+
+
+class ViolationLog:
+    def __init__(self, path=None, recent=20, writer=None):
+        """
+        Open (or create) a violation log
+
+        Args:
+            path: JSONL file to append to; None writes to a temporary file
+                  that is deleted on close()
+            recent: Entries kept in memory for status polling
+            writer: AsyncWriter to hand appends to (None = write inline)
+        """
+        self._owns_file = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="violations_", suffix=".jsonl")
+            os.close(fd)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = str(path)
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counts = {}
+        self.total = 0
+        self.recent = deque(maxlen=recent)
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._replay()
+        self.writer = writer
+        self._file = None if writer else open(self.path, "ab")
+
+    def _replay(self):
+        """Rebuild the summary from an existing log (e.g. after a restart)"""
+        for entry, _ in self._read_from(0):
+            self._count(entry)
+
+    def _count(self, entry):
+        self.total += 1
+        self.counts[entry.get('type')] = self.counts.get(entry.get('type'), 0) + 1
+        self.recent.append(entry)
+        if self.first_timestamp is None:
+            self.first_timestamp = entry.get('timestamp')
+        self.last_timestamp = entry.get('timestamp')
+
+    def append(self, entry: dict) -> dict:
+        """Write one violation and update the summary; returns the entry with its 'seq'"""
+        with self._lock:
+            entry = dict(entry, seq=self.total + 1)
+            line = json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n"
+            if self.writer:
+                self.writer.append_bytes(self.path, line)
+            else:
+                self._file.write(line)
+                self._file.flush()
+            self._count(entry)
+        return entry
+
+    def flush(self):
+        """Make every appended entry readable from disk"""
+        if self.writer:
+            self.writer.flush()
+        else:
+            with self._lock:
+                self._file.flush()
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        """Stream every entry on disk, oldest first (call flush() first, unless on the writer thread)"""
+        for entry, _ in self._read_from(0):
+            yield entry
+
+    def tail(self, n):
+        """Last n entries (at most the in-memory window)"""
+        with self._lock:
+            return list(self.recent)[-n:] if n > 0 else []
+
+    def summary(self):
+        with self._lock:
+            return {
+                'total': self.total,
+                'counts': dict(self.counts),
+                'first_timestamp': self.first_timestamp,
+                'last_timestamp': self.last_timestamp,
+            }
+
+    def page(self, cursor=0, limit=50):
+        """
+        Read up to limit entries starting at cursor
+
+        Args:
+            cursor: 0 for the start of the log, or a 'next_cursor' from a previous page
+            limit: Maximum entries returned
+
+        Returns:
+            dict: {'violations': [...], 'next_cursor': int or None when the log is exhausted}
+        """
+        self.flush()
+        entries = []
+        next_cursor = None
+        for entry, start in self._read_from(cursor):
+            if len(entries) == limit:
+                next_cursor = start
+                break
+            entries.append(entry)
+        return {'violations': entries, 'next_cursor': next_cursor}
+
+    def _read_from(self, offset):
+        """Yield (entry, byte offset where its line starts) from a byte offset"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                if not line.endswith(b"\n"):
+                    return  # partially written last line
+                start = offset
+                offset += len(line)
+                line = line.strip()
+                if line:
+                    yield json.loads(line), start
+
+    def write_json_array(self, f, indent="  "):
+        """Stream all entries into an open text file as the items of a JSON array"""
+        f.write("[")
+        first = True
+        for entry in self:
+            f.write("\n" if first else ",\n")
+            f.write(indent + json.dumps(entry))
+            first = False
+        f.write("\n]" if not first else "]")
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._file:
+                self._file.close()
+        if self._owns_file:
+            if self.writer:
+                # After the appends still queued for this file
+                self.writer.call(_remove_quietly, self.path)
+            else:
+                _remove_quietly(self.path)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,246 @@
+"""
+Violation Rules - declarative, time-based violation rules for a proctoring session
+
+Each rule is a plain dict (so exams can ship them as JSON):
+
+    {"type": "NO_FACE_DETECTED", "when": "face_count == 0", "duration": 3, "window": 10}
+        fires when the condition held for 3 s in total within the last 10 s
+        (window defaults to duration, i.e. "for 3 s straight")
+
+    {"type": "IDENTITY_MISMATCH", "when": "identity_score < 0.4", "count": 5, "of_last": 8}
+        fires when 5 of the last 8 observations that have the field matched
+
+"when" is one condition or several joined with " and "; each compares an
+observation field with a JSON literal. "details" lists observation fields to
+copy into the violation. After firing, a rule's window starts over.
+
+Rule state is fixed-size (a ring of time buckets, or of the last N results),
+so each observation costs O(1) per rule regardless of frame rate or window.
+"""
+import re
+import json
+import operator
+
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+_CONDITION = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|<|>)\s*(.+?)\s*$")
+
+# Time-window resolution: a window is tracked as this many buckets (plus the
+# one being filled, so the buckets always cover at least the whole window)
+WINDOW_BUCKETS = 20
+
+DEFAULT_RULES = [
+    {"type": "NO_FACE_DETECTED", "when": "face_count == 0", "duration": 1.0},
+    {"type": "MULTIPLE_FACES", "when": "face_count > 1", "duration": 1.0},
+    {"type": "LIVENESS_FAILED", "when": "face_count == 1 and is_live == false", "duration": 1.0,
+     "details": ["motion_score", "eyes_detected"]},
+    {"type": "IDENTITY_MISMATCH", "when": "identity_score < 0.4", "count": 5, "of_last": 8,
+     "details": ["identity_score"]},
+]
+
+
+def parse_condition(text):
+    """
+    Parse "field op literal [and field op literal ...]"
+
+    Returns:
+        list: (field, operator function, value) tuples, all of which must hold
+    """
+    clauses = []
+    for part in text.split(" and "):
+        match = _CONDITION.match(part)
+        if not match:
+            raise ValueError(f"Invalid rule condition: {part!r}")
+        field, op, literal = match.groups()
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            raise ValueError(f"Invalid value in rule condition: {literal!r}")
+        clauses.append((field, OPERATORS[op], value))
+    return clauses
+
+
+class _Rule:
+    def __init__(self, spec):
+        if "type" not in spec or "when" not in spec:
+            raise ValueError(f"Rule needs 'type' and 'when': {spec}")
+        self.spec = spec
+        self.type = spec["type"]
+        self.clauses = parse_condition(spec["when"])
+        self.details = spec.get("details", [])
+        self.fired = 0
+
+    def evaluate(self, observation):
+        """True/False, or None when the observation lacks a field (e.g. no identity check this frame)"""
+        for field, op, value in self.clauses:
+            observed = observation.get(field)
+            if observed is None:
+                return None
+            if not op(observed, value):
+                return False
+        return True
+
+
+class DurationRule(_Rule):
+    """Condition held for 'duration' seconds within the last 'window' seconds"""
+    def __init__(self, spec, max_gap=1.0):
+        """
+        Args:
+            spec: Rule dict with 'duration' and optional 'window' (seconds)
+            max_gap: Longest time one observation may account for (e.g. after a stall)
+        """
+        super().__init__(spec)
+        self.duration = float(spec["duration"])
+        self.window = float(spec.get("window", self.duration))
+        if self.duration <= 0 or self.window < self.duration:
+            raise ValueError(f"Rule {self.type}: need 0 < duration <= window")
+        self.max_gap = max_gap
+        self._width = self.window / WINDOW_BUCKETS
+        self._slots = WINDOW_BUCKETS + 1
+        self.reset()
+
+    def reset(self):
+        self._last_time = None
+        self.clear()
+
+    def clear(self):
+        """Empty the window (after firing), keeping the clock"""
+        self._buckets = [0.0] * self._slots
+        self._head = None  # absolute index of the newest bucket
+        self.held = 0.0
+
+    def _advance(self, timestamp):
+        index = int(timestamp // self._width)
+        if self._head is None:
+            self._head = index
+            return
+        if index <= self._head:
+            return
+        # Clear the buckets that slid out of the window (at most all of them)
+        for step in range(1, min(index - self._head, self._slots) + 1):
+            slot = (self._head + step) % self._slots
+            self.held -= self._buckets[slot]
+            self._buckets[slot] = 0.0
+        self.held = max(self.held, 0.0)
+        self._head = index
+
+    def update(self, observation, timestamp):
+        """Feed one observation; returns True when the rule fires"""
+        matched = self.evaluate(observation)
+        elapsed = 0.0 if self._last_time is None else min(max(timestamp - self._last_time, 0.0), self.max_gap)
+        self._last_time = timestamp
+        self._advance(timestamp)
+        if not matched:
+            return False
+
+        # The observation stands for the time since the previous one
+        self._buckets[self._head % self._slots] += elapsed
+        self.held += elapsed
+        return self.held >= self.duration - 1e-9
+
+    def describe(self):
+        return f"{self.spec['when']} for {self.duration:g}s within {self.window:g}s"
+
+    def evidence(self):
+        return {'held_s': round(self.held, 3), 'window_s': self.window}
+
+
+class CountRule(_Rule):
+    """Condition matched in 'count' of the last 'of_last' observations that have its fields"""
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.count = int(spec["count"])
+        self.of_last = int(spec.get("of_last", self.count))
+        if self.count <= 0 or self.of_last < self.count:
+            raise ValueError(f"Rule {self.type}: need 0 < count <= of_last")
+        self.reset()
+
+    def reset(self):
+        self._ring = [False] * self.of_last
+        self._seen = 0
+        self.matches = 0
+
+    clear = reset
+
+    def update(self, observation, timestamp):
+        matched = self.evaluate(observation)
+        if matched is None:
+            return False
+        slot = self._seen % self.of_last
+        self.matches += matched - self._ring[slot]
+        self._ring[slot] = matched
+        self._seen += 1
+        return self.matches >= self.count
+
+    def describe(self):
+        return f"{self.spec['when']} in {self.count} of last {self.of_last}"
+
+    def evidence(self):
+        return {'matches': self.matches, 'of_last': self.of_last}
+
+
+def build_rule(spec):
+    if "count" in spec:
+        return CountRule(spec)
+    if "duration" in spec:
+        return DurationRule(spec)
+    raise ValueError(f"Rule {spec.get('type')}: needs 'duration' or 'count'")
+
+
+def load_rules(path):
+    """Read a JSON list of rule dicts"""
+    with open(path) as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{path}: expected a JSON list of rules")
+    return rules
+
+
+class RuleEngine:
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules: List of rule dicts (default: DEFAULT_RULES)
+        """
+        self.rules = [build_rule(spec) for spec in (DEFAULT_RULES if rules is None else rules)]
+
+    def update(self, observation, timestamp):
+        """
+        Feed one observation to every rule
+
+        Args:
+            observation: Dict of fields (face_count, is_live, identity_score, ...)
+            timestamp: Observation time in seconds (video time or monotonic clock)
+
+        Returns:
+            list: One violation dict per rule that fired: {'type', 'rule', 'details'}
+        """
+        fired = []
+        for rule in self.rules:
+            if not rule.update(observation, timestamp):
+                continue
+            details = {field: observation.get(field) for field in rule.details}
+            details.update(rule.evidence())
+            fired.append({'type': rule.type, 'rule': rule.describe(), 'details': details})
+            rule.fired += 1
+            rule.clear()
+        return fired
+
+    def reset(self):
+        for rule in self.rules:
+            rule.reset()
+            rule.fired = 0
+
+    def get_stats(self):
+        """Violations fired per type"""
+        stats = {}
+        for rule in self.rules:
+            stats[rule.type] = stats.get(rule.type, 0) + rule.fired
+        return stats
@@ -0,0 +1,254 @@
+"""
+Pre-forked worker pool - runs one request handler (and one model set) per process
+"""
+import sys
+import time
+import zlib
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+
+def _worker_main(conn, handler_factory):
+    """Worker process entry point: load models once, then answer requests"""
+    # stdout is the supervisor's JSON channel; keep stray prints off it
+    sys.stdout = sys.stderr
+
+    handler = handler_factory()
+    warm_up = getattr(handler, "warm_up", None)
+    if warm_up is not None:
+        warm_up()
+    conn.send((None, "ready"))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if msg is None:
+            break
+
+        seq, req = msg
+        try:
+            resp = handler.handle(req)
+        except Exception as exc:
+            resp = {"id": req.get("id"), "error": str(exc)}
+        conn.send((seq, resp))
+
+    # Processes started by multiprocessing skip atexit hooks; let the handler flush now
+    close = getattr(handler, "close", None)
+    if close is not None:
+        close()
+
+
+class _Worker:
+    def __init__(self, index, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.inflight = {}  # seq -> client request id
+
+
+class WorkerPool:
+    def __init__(self, size, handler_factory, on_response, restart_backoff=1.0, max_backoff=30.0):
+        """
+        Initialize the worker pool
+
+        Args:
+            size: Number of worker processes
+            handler_factory: Picklable callable returning an object with handle(req) -> dict
+            on_response: Called with each response dict, in completion order
+            restart_backoff: Initial delay before restarting a worker that died during startup
+            max_backoff: Upper bound for the restart delay
+        """
+        self.size = size
+        self.handler_factory = handler_factory
+        self.on_response = on_response
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+
+        # Fork keeps start-up cheap where available; Windows only has spawn
+        method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        self._ctx = mp.get_context(method)
+
+        self._lock = threading.Lock()
+        self._workers = [None] * size
+        self._restart_at = {}  # index -> monotonic time
+        self._backoff = [restart_backoff] * size
+        self._backlog = []
+        self._seq = 0
+        self._closed = False
+        self._collector = None
+        self.restarts = 0
+        # Set once every worker has loaded its models the first time
+        self.ready_event = threading.Event()
+
+    def start(self):
+        """Fork all workers and start collecting responses"""
+        for index in range(self.size):
+            self._spawn(index)
+        self._collector = threading.Thread(target=self._collect, name="worker-pool-collector", daemon=True)
+        self._collector.start()
+        print(f"✓ Worker pool started ({self.size} workers)", file=sys.stderr)
+
+    def _spawn(self, index):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.handler_factory),
+            name=f"verify-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        with self._lock:
+            self._workers[index] = _Worker(index, process, parent_conn)
+
+    def submit(self, req: dict):
+        """Dispatch a request to its session's worker, or else the least loaded live one"""
+        with self._lock:
+            worker = self._pick_worker(req.get("session"))
+            if worker is None:
+                self._backlog.append(req)
+                return
+            self._seq += 1
+            seq = self._seq
+            worker.inflight[seq] = req.get("id")
+
+        # Send outside the lock: a full pipe must not stall the collector
+        self._send(worker, seq, req)
+
+    def _pick_worker(self, session=None):
+        if session is not None:
+            # Stable per session, so one worker sees the whole stream (ROI, liveness history)
+            preferred = self._workers[zlib.crc32(str(session).encode("utf-8")) % self.size]
+            if preferred is not None and preferred.process.is_alive():
+                return preferred
+        alive = [w for w in self._workers if w is not None and w.process.is_alive()]
+        if not alive:
+            return None
+        return min(alive, key=lambda w: (not w.ready, len(w.inflight)))
+
+    def _send(self, worker, seq, req):
+        try:
+            worker.conn.send((seq, req))
+        except (OSError, ValueError) as exc:
+            with self._lock:
+                owned = seq in worker.inflight
+                worker.inflight.pop(seq, None)
+            # If the collector already failed this request for a dead worker, stay quiet
+            if owned:
+                self.on_response({"id": req.get("id"), "error": f"Worker unavailable: {exc}"})
+
+    def pending(self) -> int:
+        """Number of requests dispatched or queued but not yet answered"""
+        with self._lock:
+            return len(self._backlog) + sum(len(w.inflight) for w in self._workers if w is not None)
+
+    def _collect(self):
+        while not self._closed:
+            with self._lock:
+                workers = [w for w in self._workers if w is not None]
+            waitables = [w.conn for w in workers] + [w.process.sentinel for w in workers]
+
+            ready = wait(waitables, timeout=0.5) if waitables else []
+            if not waitables:
+                time.sleep(0.1)
+
+            for worker in workers:
+                if worker.conn in ready:
+                    self._drain(worker)
+                if worker.process.sentinel in ready or not worker.process.is_alive():
+                    self._handle_exit(worker)
+
+            self._restart_due()
+
+    def _drain(self, worker):
+        while True:
+            try:
+                if not worker.conn.poll():
+                    return
+                seq, resp = worker.conn.recv()
+            except (EOFError, OSError):
+                return
+
+            if seq is None:
+                worker.ready = True
+                with self._lock:
+                    self._backoff[worker.index] = self.restart_backoff
+                    all_ready = all(w is not None and w.ready for w in self._workers)
+                if all_ready:
+                    self.ready_event.set()
+                continue
+
+            with self._lock:
+                known = seq in worker.inflight
+                worker.inflight.pop(seq, None)
+            if known:
+                self.on_response(resp)
+
+    def _handle_exit(self, worker):
+        with self._lock:
+            if self._closed or self._workers[worker.index] is not worker:
+                return
+            self._workers[worker.index] = None
+            lost = list(worker.inflight.values())
+            worker.inflight.clear()
+
+            delay = 0.0
+            if not worker.ready:
+                # Died while loading models: back off instead of crash-looping
+                delay = self._backoff[worker.index]
+                self._backoff[worker.index] = min(delay * 2, self.max_backoff)
+            self._restart_at[worker.index] = time.monotonic() + delay
+
+        worker.conn.close()
+        code = worker.process.exitcode
+        print(f"⚠ Worker {worker.index} exited (code {code}), {len(lost)} request(s) lost", file=sys.stderr)
+        for req_id in lost:
+            self.on_response({"id": req_id, "error": "Worker crashed while processing request"})
+
+    def _restart_due(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [index for index, at in self._restart_at.items() if at <= now]
+            for index in due:
+                del self._restart_at[index]
+        if not due:
+            return
+
+        # Fork outside the lock: the child must not inherit it held by this thread
+        for index in due:
+            self._spawn(index)
+        with self._lock:
+            self.restarts += len(due)
+            backlog, self._backlog = self._backlog, []
+
+        for index in due:
+            print(f"✓ Worker {index} restarted", file=sys.stderr)
+        for req in backlog:
+            self.submit(req)
+
+    def close(self, timeout=10.0):
+        """Wait for in-flight requests, then stop all workers"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        with self._lock:
+            self._closed = True
+            workers = [w for w in self._workers if w is not None]
+            self._restart_at.clear()
+
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self._collector is not None:
+            self._collector.join(timeout=1.0)
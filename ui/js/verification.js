@@ -222,6 +222,8 @@ function startBackendVerificationLoop(videoElement) {
 
         try {
             const result = await window.electronAPI.verifyFrame({ image: frameData });
+            // Superseded by a newer frame or too old to matter; its result will come with the next one
+            if (result && result.dropped) return;
             if (!result || result.error) {
                 console.warn('Verification error:', result?.error);
                 addWarning('Backend Error: ' + (result?.error || 'Unknown'), 'error');